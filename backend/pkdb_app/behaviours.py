@@ -4,7 +4,7 @@ Reusable behavior for models.
 from django.contrib.auth import get_user_model
 from django.db import models
 
-from pkdb_app.info_nodes.units import ureg
+from pkdb_app.info_nodes.conversions import unit_conversions
 from .utils import CHAR_MAX_LENGTH_LONG, CHAR_MAX_LENGTH
 
 
@@ -26,28 +26,57 @@ class Externable(models.Model):
         abstract = True
 
 
+class StudySnapshot(object):
+    """ Study and permission data of a study.
+
+    Computed once per study and set as 'study_snapshot' on the Accessible instances
+    of the study during indexing, so that the permission data is not queried per instance.
+    """
+
+    def __init__(self, study):
+        self.access = study.access
+        self.name = study.name
+        self.sid = study.sid
+        self.allowed_users = list(Accessible.study_allowed_users(study))
+
+
 class Accessible(models.Model):
     class Meta:
         abstract = True
 
+    @property
+    def _snapshot(self):
+        return getattr(self, "study_snapshot", None)
+
+    @staticmethod
+    def study_allowed_users(study):
+        creator_queryset = get_user_model().objects.filter(id=study.creator_id)
+        curators = study.curators.all()
+        collaborators = study.collaborators.all()
+        return collaborators.union(curators).union(creator_queryset)
+
     @property
     def access(self):
+        if self._snapshot:
+            return self._snapshot.access
         return self.study.access
 
     @property
     def allowed_users(self):
-        creator = self.study.creator
-        creator_queryset = get_user_model().objects.filter(id=creator.id)
-        curators = self.study.curators.all()
-        collaborators = self.study.collaborators.all()
-        return collaborators.union(curators).union(creator_queryset)
+        if self._snapshot:
+            return self._snapshot.allowed_users
+        return self.study_allowed_users(self.study)
 
     @property
     def study_name(self):
+        if self._snapshot:
+            return self._snapshot.name
         return self.study.name
 
     @property
     def study_sid(self):
+        if self._snapshot:
+            return self._snapshot.sid
         return self.study.sid
 
 
@@ -194,18 +223,25 @@ class Normalizable(MeasurementTypeable):
 
         return (False, None)
 
+    @property
+    def conversion(self):
+        """ Compiled conversion of the values to the normalized unit.
+
+        :return: Conversion (see info_nodes.conversions)
+        """
+        substance = getattr(self, "substance", None)
+        mass = substance.mass if substance else None
+        return unit_conversions.get(self.measurement_type, self.unit, mass)
+
     def remove_substance_dimension(self):
         """ Remove substance unit by using the molar mass in [g/mole] to
         convert [mole] -> [g].
 
         :return: tuple (magnitude, unit), i.e., pre-factor and resulting unit
         """
-        is_removeable_substance, dimension = self.is_removeable_substance_dimension
-        if is_removeable_substance:
-            molar_weight = ureg("g/mol") * self.substance.mass
-            p_unit = self.measurement_type.p_unit(self.unit)
-            this_quantity = p_unit * molar_weight ** dimension
-            return this_quantity.magnitude, str(this_quantity.units)
+        conversion = self.conversion
+        if conversion.substance_factor is not None:
+            return conversion.substance_factor, conversion.substance_unit
         else:
             return 1, self.unit
 
@@ -215,28 +251,25 @@ class Normalizable(MeasurementTypeable):
         Units are brought to default units.
         Values are changed according to the conversion factor.
         If possible removes substance dimension (mole -> g) via molecular weight.
+        The conversion factors are compiled once per measurement type, unit and substance.
 
         :return:
         """
+        if not self.unit:
+            return
 
-        factor, unit = self.remove_substance_dimension()
+        conversion = self.conversion
 
         # remove substance unit
-
-        if unit and self.unit:
-            if ureg(unit) != ureg(self.unit):
-                for key, value in self.norm_fields.items():
-                    if value is not None:
-                        setattr(self, key, value * factor)
-                self.unit = unit
-
-            # else:
-            #    self.unit = str(ureg(self.unit).u)
+        if conversion.substance_factor is not None:
+            for key, value in self.norm_fields.items():
+                if value is not None:
+                    setattr(self, key, value * conversion.substance_factor)
+            self.unit = conversion.substance_unit
 
         # normalization
-        if not self.is_norm:
+        if conversion.factor is not None:
             for key, value in self.norm_fields.items():
-                if not value is None:
-                    setattr(self, key, self.measurement_type.normalize(value, self.unit).magnitude)
-
-            self.unit = str(self.measurement_type.norm_unit(self.unit))
+                if value is not None:
+                    setattr(self, key, value * conversion.factor + conversion.offset)
+            self.unit = conversion.unit
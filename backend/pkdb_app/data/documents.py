@@ -28,6 +28,8 @@ class DataAnalysisDocument(Document):
 
     # for permissions
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study_sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
         properties={
@@ -99,6 +101,8 @@ class SubSetDocument(Document):
     study_sid = string_field('study_sid')
     study_name = string_field('study_name')
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study__sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
 
@@ -0,0 +1,111 @@
+"""
+Benchmarks the merging of subset values on synthetic timecourse values.
+
+Compares the former merge per subset via 'groupby.apply' with SubSet.merge_values_by_subset,
+which merges the values of all subsets at once. No database access is required.
+
+python manage.py benchmark_merge_values
+python manage.py benchmark_merge_values --subsets 50 --points 800
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from pkdb_app.data.models import SubSet
+
+# numeric fields with values (all other numeric fields are missing)
+PRESENT_NUMBERS = ["outputs__mean", "outputs__sd"]
+MISSING_NUMBERS = ["outputs__value", "outputs__median", "outputs__min", "outputs__max", "outputs__se",
+                   "outputs__cv"]
+
+
+def synthetic_values(n_subsets: int, n_points: int, n_interventions: int = 2, seed: int = 42) -> list:
+    """ Timecourse values (see Timecourseable.keys_timecourse_representation) of the subsets.
+
+    Every point is an output with 'n_interventions' interventions, i.e. one row per intervention.
+    """
+    rng = np.random.default_rng(seed)
+    keys = list(SubSet().keys_timecourse_representation().values())
+    values = []
+    output_pk = 0
+    for subset_pk in range(1, n_subsets + 1):
+        constants = {key: f"{key}_{subset_pk}" for key in keys}
+        constants.update({
+            "subset_id": subset_pk,
+            "outputs__group_id": subset_pk,
+            "outputs__individual_id": None,
+            "outputs__normed": True,
+            "outputs__calculated": False,
+            **{key: None for key in MISSING_NUMBERS},
+        })
+        for point in range(n_points):
+            output_pk += 1
+            numbers = {key: float(rng.random()) for key in PRESENT_NUMBERS}
+            for intervention in range(n_interventions):
+                values.append({
+                    **constants,
+                    **numbers,
+                    "outputs__pk": output_pk,
+                    "outputs__time": float(point),
+                    "outputs__interventions__pk": subset_pk * n_interventions + intervention,
+                })
+    return values
+
+
+def merge_values_apply(values, groupby=("outputs__pk",), sort_values=["outputs__interventions__pk", "outputs__time"]):
+    """ Former SubSet.merge_values via 'groupby.apply'."""
+    df = pd.DataFrame(values)
+    if sort_values:
+        df = df.sort_values(sort_values)
+    merged_dict = df.groupby(list(groupby), as_index=False).apply(SubSet.to_list).to_dict("list")
+
+    for key, values in merged_dict.items():
+        if key not in ['outputs__time', 'outputs__value', 'outputs__mean', 'outputs__median', 'outputs__cv',
+                       'outputs__sd' 'outputs__se']:
+            merged_dict[key] = SubSet.tuple_or_value(values)
+
+        if all(v is None for v in values):
+            merged_dict[key] = None
+
+    return merged_dict
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the merging of subset values (groupby.apply vs merge_values_by_subset)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subsets', default=100, type=int, help="Number of synthetic subsets")
+        parser.add_argument('--points', default=300, type=int, help="Number of points per subset")
+        parser.add_argument('--repeat', default=3, type=int, help="Number of runs, the best run is reported")
+        parser.add_argument('--seed', default=42, type=int, help="Seed of the synthetic values")
+
+    def best_time(self, func, repeat):
+        times = []
+        for _ in range(repeat):
+            time_start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - time_start)
+        return min(times)
+
+    def handle(self, *args, **options):
+        values = synthetic_values(options['subsets'], options['points'], seed=options['seed'])
+        values_by_subset = {}
+        for value in values:
+            values_by_subset.setdefault(value["subset_id"], []).append(value)
+
+        def merge_apply():
+            return {pk: merge_values_apply(subset_values) for pk, subset_values in values_by_subset.items()}
+
+        def merge_by_subset():
+            return SubSet.merge_values_by_subset(values)
+
+        time_apply = self.best_time(merge_apply, options['repeat'])
+        time_by_subset = self.best_time(merge_by_subset, options['repeat'])
+
+        self.stdout.write(f"subsets: {len(values_by_subset)}, points per subset: {options['points']}, "
+                          f"rows: {len(values)}")
+        self.stdout.write(f"groupby.apply per subset: {time_apply:.3f} s")
+        self.stdout.write(f"merge_values_by_subset:   {time_by_subset:.3f} s")
+        self.stdout.write(self.style.SUCCESS(f"speedup: {time_apply / time_by_subset:.1f}x"))
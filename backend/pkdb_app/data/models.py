@@ -8,6 +8,7 @@ from pkdb_app.behaviours import Accessible
 from pkdb_app.interventions.models import Intervention
 from pkdb_app.utils import CHAR_MAX_LENGTH
 from django.utils.translation import gettext_lazy as _
+import numpy as np
 import pandas as pd
 from django.apps import apps
 
@@ -169,6 +170,63 @@ class Timecourseable(models.Model):
             return list(values)[0]
         return tuple(values)
 
+    # fields which are not collapsed to a single value over the merged groups
+    MERGE_ARRAY_FIELDS = ['outputs__time', 'outputs__value', 'outputs__mean', 'outputs__median', 'outputs__cv']
+
+    @staticmethod
+    def _merge_groups(df, groupby):
+        """ Merges the rows of every group of the data frame.
+
+        The values of a column are merged per group to None if all values are missing,
+        to the value if all values are identical and to the tuple of values otherwise.
+        The groups are sorted by the groupby keys, the rows of a group keep their order.
+
+        :return: dict of column -> list of merged values per group
+        """
+        codes = df.groupby(list(groupby), sort=True).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        # rows with missing keys are not part of any group
+        rows = np.flatnonzero(codes >= 0)
+        if len(rows) == 0:
+            return {key: [] for key in df.columns}
+        order = rows[np.argsort(codes[rows], kind="stable")]
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        sizes = np.diff(np.r_[starts, len(order)])
+        bounds = np.r_[starts, len(order)].tolist()
+
+        merged = {}
+        for key in df.columns:
+            column = df[key].to_numpy()[order]
+            present = np.add.reduceat((~pd.isna(column)).astype(np.int64), starts)
+            identical = np.logical_and.reduceat(
+                np.asarray(column == np.repeat(column[starts], sizes), dtype=bool), starts)
+            unique = (present == sizes) & identical
+
+            values = column.tolist()
+            merged_values = []
+            for group, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+                if present[group] == 0:
+                    merged_values.append(None)
+                elif unique[group]:
+                    merged_values.append(values[start])
+                else:
+                    merged_values.append(tuple(values[start:end]))
+            merged[key] = merged_values
+        return merged
+
+    @staticmethod
+    def _collapse_groups(merged):
+        """ Collapses the merged groups to a single value per field if possible. """
+        merged_dict = {}
+        for key, values in merged.items():
+            if all(v is None for v in values):
+                merged_dict[key] = None
+            elif key in SubSet.MERGE_ARRAY_FIELDS:
+                merged_dict[key] = values
+            else:
+                merged_dict[key] = SubSet.tuple_or_value(values)
+        return merged_dict
+
     @staticmethod
     def merge_values(values=None, df=None, groupby=("outputs__pk",),
                      sort_values=["outputs__interventions__pk", "outputs__time"]):
@@ -177,17 +235,34 @@ class Timecourseable(models.Model):
             df = pd.DataFrame(values)
         if sort_values:
             df = df.sort_values(sort_values)
-        merged_dict = df.groupby(list(groupby), as_index=False).apply(SubSet.to_list).to_dict("list")
+        return SubSet._collapse_groups(SubSet._merge_groups(df, groupby))
 
-        for key, values in merged_dict.items():
-            if key not in ['outputs__time', 'outputs__value', 'outputs__mean', 'outputs__median', 'outputs__cv',
-                           'outputs__sd' 'outputs__se']:
-                merged_dict[key] = SubSet.tuple_or_value(values)
+    @staticmethod
+    def merge_values_by_subset(values=None, df=None, subset_key="subset_id", groupby=("outputs__pk",),
+                               sort_values=["outputs__interventions__pk", "outputs__time"]):
+        """ Merged values for many subsets at once (see merge_values).
 
-            if all(v is None for v in values):
-                merged_dict[key] = None
+        :param subset_key: column of the subset pk
+        :return: dict of subset pk -> merged values
+        """
+        if values:
+            df = pd.DataFrame(values)
+        if df is None or df.empty:
+            return {}
+        if sort_values:
+            df = df.sort_values(sort_values)
 
-        return merged_dict
+        merged = SubSet._merge_groups(df, [subset_key, *groupby])
+        # groups are sorted by subset first, i.e. the groups of a subset are contiguous
+        subset_pks = merged[subset_key]
+        merged_by_subset = {}
+        start = 0
+        for end in range(1, len(subset_pks) + 1):
+            if end == len(subset_pks) or subset_pks[end] != subset_pks[start]:
+                merged_by_subset[subset_pks[start]] = SubSet._collapse_groups(
+                    {key: values[start:end] for key, values in merged.items()})
+                start = end
+        return merged_by_subset
 
     def get_name(self, values, Model):
         if isinstance(values, int):
@@ -219,6 +294,9 @@ class Timecourseable(models.Model):
 
 
 class SubSet(Accessible, Timecourseable):
+    # keys shared by both dimensions of the scatter representation
+    SCATTER_IDENTICAL_KEYS = ["study_sid", "study_name", "subset_pk", "subset_name"]
+
     name = models.CharField(max_length=CHAR_MAX_LENGTH)
     data = models.ForeignKey(Data, related_name="subsets", on_delete=models.CASCADE)
     study = models.ForeignKey('studies.Study', on_delete=models.CASCADE, related_name="subsets")
@@ -263,17 +341,44 @@ class SubSet(Accessible, Timecourseable):
     @cached_property
     def scatter_representation(self):
         scatter_x = self.merge_values(self.data_points.filter(dimensions__dimension=0).values(*self.keys_scatter_representation().values()), sort_values=None)
-        self.reformat_timecourse(scatter_x, self.keys_scatter_representation())
-
         scatter_y = self.merge_values(self.data_points.filter(dimensions__dimension=1).prefetch_related('outputs').values(*self.keys_scatter_representation().values()),sort_values=None)
+        return self._scatter_representation(scatter_x, scatter_y)
+
+    @classmethod
+    def scatter_representations(cls, subsets):
+        """ Scatter representations of many subsets. The data points of all subsets are merged at once."""
+        subsets = list(subsets)
+        if not subsets:
+            return
+        keys = subsets[0].keys_scatter_representation()
+        data_points = DataPoint.objects.filter(subset__in=subsets)
+        scatters_x = cls.merge_values_by_subset(
+            data_points.filter(dimensions__dimension=0).values(*keys.values()), sort_values=None)
+        scatters_y = cls.merge_values_by_subset(
+            data_points.filter(dimensions__dimension=1).values(*keys.values()), sort_values=None)
+        for subset in subsets:
+            if subset.pk in scatters_x and subset.pk in scatters_y:
+                yield subset._scatter_representation(scatters_x[subset.pk], scatters_y[subset.pk])
+
+    def _scatter_representation(self, scatter_x, scatter_y):
+        self.reformat_timecourse(scatter_x, self.keys_scatter_representation())
         self.reformat_timecourse(scatter_y, self.keys_scatter_representation())
 
-        identical_keys = ["study_sid", "study_name", "subset_pk", "subset_name"]
+        identical_keys = self.SCATTER_IDENTICAL_KEYS
 
         return {**{k: v for k, v in scatter_x.items() if k in identical_keys},
                 **{f"x_{k}": v for k, v in scatter_x.items() if k not in identical_keys},
                 **{f"y_{k}": v for k, v in scatter_y.items() if k not in identical_keys}}
 
+    @classmethod
+    def scatter_fields(cls):
+        """ Keys of the scatter representations in the order of _scatter_representation. """
+        keys = list(cls().keys_scatter_representation())
+        identical_keys = cls.SCATTER_IDENTICAL_KEYS
+        return ([k for k in keys if k in identical_keys] +
+                [f"x_{k}" for k in keys if k not in identical_keys] +
+                [f"y_{k}" for k in keys if k not in identical_keys])
+
 class DataPoint(models.Model):
     """
     A DataSetPoint can have multiple dimensions. These dimensions are spanned by outputs.
@@ -1,6 +1,6 @@
-import json
-import traceback
+from collections import OrderedDict
 
+from django.db.models import Case, When, Value, IntegerField
 from django.utils.functional import cached_property
 from django_elasticsearch_dsl_drf.serializers import DocumentSerializer
 from pkdb_app.behaviours import MEASUREMENTTYPE_FIELDS
@@ -9,16 +9,42 @@ from pkdb_app.comments.serializers import DescriptionSerializer, CommentSerializ
 from pkdb_app.data.documents import SubSetDocument
 from pkdb_app.data.models import DataSet, Data, SubSet, Dimension, DataPoint
 from pkdb_app.outputs.models import Output
-from pkdb_app.outputs.pk_calculation import pkoutputs_from_timecourse
+from pkdb_app.outputs.pk_calculation import pkoutputs_from_timecourses
 from pkdb_app.outputs.serializers import OUTPUT_FOREIGN_KEYS, OUTPUT_FIELDS
 from pkdb_app.serializers import WrongKeyValidationSerializer, ExSerializer, StudySmallElasticSerializer
 from pkdb_app.subjects.models import DataFile
-from pkdb_app.utils import _create, create_multiple_bulk, create_multiple_bulk_normalized, list_of_pk
+from pkdb_app.utils import _create, create_multiple_bulk_normalized, list_of_pk
 from rest_framework import serializers
 import pandas as pd
 import numpy as np
 
-from functools import lru_cache
+
+
+# name of the data instance containing the autogenerated timecourses
+AUTOGENERATED_TIMECOURSES = "AutoGenerate"
+
+
+def create_timecourse_data_points(study, outputs_by_subset):
+    """ Creates the data points and dimensions of timecourse subsets with bulk inserts.
+
+    Every output is a data point with a single dimension.
+
+    :param outputs_by_subset: dict of subset pk -> output pks
+    """
+    subset_outputs = [
+        (subset_pk, output_pk) for subset_pk, output_pks in outputs_by_subset.items() for output_pk in output_pks
+    ]
+    data_points = DataPoint.objects.bulk_create([DataPoint(subset_id=subset_pk) for subset_pk, _ in subset_outputs])
+    Dimension.objects.bulk_create([
+        Dimension(dimension=0, study=study, output_id=output_pk, data_point=data_point)
+        for data_point, (_, output_pk) in zip(data_points, subset_outputs)
+    ])
+    Output.objects.filter(pk__in=[output_pk for _, output_pk in subset_outputs]).update(
+        subset_id=Case(
+            *[When(pk__in=output_pks, then=Value(subset_pk)) for subset_pk, output_pks in outputs_by_subset.items()],
+            output_field=IntegerField()
+        )
+    )
 
 
 class DimensionSerializer(WrongKeyValidationSerializer):
@@ -74,37 +100,42 @@ class SubSetSerializer(ExSerializer):
         if any(np.isnan(np.array(time))):
             raise serializers.ValidationError({"time": "no time points are allowed to be nan", "detail": time})
 
-    def calculate_pks_from_timecourses(self, subset):
+    def calculate_pks_from_timecourses(self, subsets):
         # calculate pharmacokinetics outputs
-        try:
-            outputs = pkoutputs_from_timecourse(subset)
-        except Exception as e:
-            raise serializers.ValidationError(
-                {"pharmacokinetics exception": traceback.format_exc()}
-            )
-
-        errors = []
-        for output in outputs:
-            try:
-                output["measurement_type"].validate_complete(output)
-            except ValueError as err:
-                errors.append(err)
-        if errors:
-            raise serializers.ValidationError(
-                {"calculated outputs": errors},
-            )
-        interventions = [o.pop("interventions") for o in outputs]
-
-        outputs_dj = create_multiple_bulk(subset, "subset", outputs, Output)
+        outputs = []
+        interventions = []
+        for subset, subset_outputs, exception in pkoutputs_from_timecourses(subsets):
+            if exception:
+                raise serializers.ValidationError(
+                    {"pharmacokinetics exception": exception}
+                )
 
-        for intervention, output in zip(interventions, outputs_dj):
-            output.interventions.add(*intervention)
+            errors = []
+            for output in subset_outputs:
+                try:
+                    output["measurement_type"].validate_complete(output)
+                except ValueError as err:
+                    errors.append(err)
+            if errors:
+                raise serializers.ValidationError(
+                    {"calculated outputs": errors},
+                )
+            for output in subset_outputs:
+                interventions.append(output.pop("interventions"))
+                outputs.append(Output(subset=subset, **output))
 
-        if outputs_dj:
+        if outputs:
+            outputs_dj = Output.objects.bulk_create(outputs)
             outputs_normed = create_multiple_bulk_normalized(outputs_dj, Output)
-            for output in outputs_normed:
-                output.interventions.add(*output.raw.interventions.all())
-        subset.save()
+            # raw and normalized outputs share the interventions
+            OutputIntervention = Output.interventions.through
+            output_interventions = []
+            for intervention_pks, output, output_normed in zip(interventions, outputs_dj, outputs_normed):
+                for intervention_pk in set(intervention_pks):
+                    output_interventions.append(OutputIntervention(output=output, intervention_id=intervention_pk))
+                    output_interventions.append(
+                        OutputIntervention(output=output_normed, intervention_id=intervention_pk))
+            OutputIntervention.objects.bulk_create(output_interventions)
 
     @staticmethod
     def _add_id_to_foreign_keys(value: str):
@@ -120,9 +151,16 @@ class SubSetSerializer(ExSerializer):
         else:
             return value
 
+    def _study_outputs_frame(self):
+        """ Normalized outputs of the study, loaded once per dataset (see DataSetSerializer.create). """
+        outputs_pd = self.context.get("study_outputs_frame")
+        if outputs_pd is None:
+            outputs_pd = pd.DataFrame(self.context["study"].outputs.filter(normed=True).values())
+            self.context["study_outputs_frame"] = outputs_pd
+        return outputs_pd
+
     def create_scatter(self, dimensions, shared, subset_instance):
         study = self.context["study"]
-        study_outputs = study.outputs.filter(normed=True)
         if len(dimensions) != 2:
             raise serializers.ValidationError(
                 f"Scatter plots have to be two dimensional. Dimensions: <{dimensions}> has a len of <{len(dimensions)}.> ")
@@ -130,9 +168,9 @@ class SubSetSerializer(ExSerializer):
         if not shared:
             raise serializers.ValidationError(
                 f"The <shared> field is required for scatter plots.")
-        outputs_pd = pd.DataFrame(study_outputs.values())
+        outputs_pd = self._study_outputs_frame()
 
-        data_set = outputs_pd[outputs_pd['label'].isin(dimensions)]
+        data_set = outputs_pd[outputs_pd['label'].isin(dimensions)].copy()
         if len(data_set) == 0:
             raise serializers.ValidationError(
                 {"data_set": {
@@ -151,71 +189,67 @@ class SubSetSerializer(ExSerializer):
                     f"Shared_field <{shared_field}> not in outputs fields. Options are <{p_options}>")
             shared_reformated.append(shared_field_reformated)
 
-        if len(data_set.groupby(shared_reformated)) == 0:
+        # outputs without values on the shared fields are not part of the scatter
+        data_set = data_set.dropna(subset=shared_reformated)
+        if len(data_set) == 0:
             raise serializers.ValidationError(
                 f"Outputs have no values on shared field")
 
-        subset_outputs = []
-        for shared_values, shared_data in data_set.groupby(shared_reformated):
-            x_data = shared_data[shared_data["dimension"] == 0]
-            y_data = shared_data[shared_data["dimension"] == 1]
+        # every combination of shared values must have exactly one x and one y output
+        data_set["x"] = data_set["dimension"] == 0
+        data_set["y"] = data_set["dimension"] == 1
+        counts = data_set.groupby(shared_reformated)[["x", "y"]].sum()
+        invalid = counts[(counts["x"] != 1) | (counts["y"] != 1)]
+        if len(invalid) > 0:
+            shared_values = invalid.index[0]
+            raise serializers.ValidationError(
+                f"Dimensions <{dimensions}> do not match in respect to the shared fields."
+                f"The shared field <{shared}> with values <{shared_values}>"
+                f" do not uniquely assign 1 x output to 1 y output. "
+                f"<{dimensions[0]}> has <{invalid['x'].iloc[0]}> outputs. "
+                f"<{dimensions[1]}> has <{invalid['y'].iloc[0]}> outputs."
+            )
 
-            if len(x_data) != 1 or len(y_data) != 1:
-                raise serializers.ValidationError(
-                    f"Dimensions <{dimensions}> do not match in respect to the shared fields."
-                    f"The shared field <{shared}> with values <{shared_values}>"
-                    f" do not uniquely assign 1 x output to 1 y output. "
-                    f"<{dimensions[0]}> has <{len(x_data)}> outputs. <{dimensions[1]}> has <{len(y_data)}> outputs."
-                )
-            data_point_instance = DataPoint.objects.create(subset=subset_instance)
-            x_output = study_outputs.get(pk=x_data["id"])
-            y_output = study_outputs.get(pk=y_data["id"])
-            subset_outputs.append(x_output)
-            subset_outputs.append(y_output)
-
-            Dimension.objects.create(dimension=0,
-                                     study=study,
-                                     output=x_output,
-                                     data_point=data_point_instance)
-            Dimension.objects.create(dimension=1,
-                                     study=study,
-                                     output=y_output,
-                                     data_point=data_point_instance)
-
-        subset_instance.pks.add(*subset_outputs)
+        pairs = data_set[data_set["x"]][shared_reformated + ["id"]].merge(
+            data_set[data_set["y"]][shared_reformated + ["id"]],
+            on=shared_reformated,
+            suffixes=("_x", "_y"),
+        ).sort_values(shared_reformated)
+        x_pks = pairs["id_x"].tolist()
+        y_pks = pairs["id_y"].tolist()
+
+        data_points = DataPoint.objects.bulk_create([DataPoint(subset=subset_instance) for _ in x_pks])
+        dimension_instances = []
+        for data_point, x_pk, y_pk in zip(data_points, x_pks, y_pks):
+            dimension_instances.append(
+                Dimension(dimension=0, study=study, output_id=x_pk, data_point=data_point))
+            dimension_instances.append(
+                Dimension(dimension=1, study=study, output_id=y_pk, data_point=data_point))
+        Dimension.objects.bulk_create(dimension_instances)
+
+        study.outputs.filter(pk__in=x_pks + y_pks).update(subset=subset_instance)
 
     def create_timecourse(self, subset_instance, dimensions):
         study = self.context["study"]
         if len(dimensions) != 1:
             raise serializers.ValidationError(
                 f"Timecourses have to be one-dimensional, but '{len(dimensions)}' dimensions found <{dimensions}>.")
-        subset_outputs = study.outputs.filter(normed=True, label=dimensions[0])
-        if len(subset_outputs) == 0:
+        output_pks = list(study.outputs.filter(normed=True, label=dimensions[0]).values_list("pk", flat=True))
+        if len(output_pks) == 0:
             raise serializers.ValidationError(
                 f"Timecourses cannot be empty. No outputs found <{dimensions[0]}>.")
-        if len(subset_outputs) == 1:
+        if len(output_pks) == 1:
             raise serializers.ValidationError(
                 f"Timecourses require at least two outputs, but only a single output exists in timecourse. "
                 f"Encode the label <{dimensions[0]}> as 'output_type=output' instead of 'output_type=timecourse'.")
-        subset_instance.pks.add(*subset_outputs)
-        if not subset_outputs.exists():
-            raise serializers.ValidationError(
-                {"dataset": {
-                    "data": [
-                        {"subsets": {"name": f"Outputs with label <{dimensions}> do not exist."}}
-                    ]
-                }}
-            )
-
-        dimensions = []
-        for output in subset_outputs.iterator():
-            data_point_instance = DataPoint.objects.create(subset=subset_instance)
+        create_timecourse_data_points(study, {subset_instance.pk: output_pks})
 
-            dimension = Dimension(dimension=0, study=study, output=output, data_point=data_point_instance)
-            dimensions.append(dimension)
-        Dimension.objects.bulk_create(dimensions)
-
-        self.calculate_pks_from_timecourses(subset_instance)
+        timecourse_subsets = self.context.get("timecourse_subsets")
+        if timecourse_subsets is None:
+            self.calculate_pks_from_timecourses([subset_instance])
+        else:
+            # pharmacokinetics of all timecourses are calculated at once (see DataSetSerializer.create)
+            timecourse_subsets.append(subset_instance)
 
 
 class DataSerializer(ExSerializer):
@@ -312,9 +346,9 @@ class DataSetSerializer(ExSerializer):
                     data_single['subsets'] = temp_subsets
                 data_container.extend(self.entries_from_file(data_single))
         self.validate_no_timeocourses(data_container)
-        autogenerate_timecourses = self.autogenerate_timecourses()
-        if autogenerate_timecourses:
-            data_container.append(autogenerate_timecourses)
+        if self.autogenerate_timecourses():
+            # timecourses are created in 'create_timecourses'
+            self._validate_unique_names(data_container + [{"name": AUTOGENERATED_TIMECOURSES}])
 
         data['data'] = data_container
         return super().to_internal_value(data)
@@ -332,15 +366,36 @@ class DataSetSerializer(ExSerializer):
 
         study_sid = self.context["request"].path.split("/")[-2]
         outputs = Output.objects.filter(study__sid=study_sid, normed=True, output_type=Output.OutputTypes.Timecourse)
-        timecourse_labels = outputs.values_list("label", flat=True).distinct()
-        if len(timecourse_labels) > 0:
-            auto_generated_data = {
-                "name": "AutoGenerate",
-                "data_type": "timecourse",
-                "subsets":
-                    [{"name": label, "dimensions": [label]} for label in timecourse_labels]
-            }
-            return auto_generated_data
+        return outputs.exists()
+
+    def create_timecourses(self, dataset_instance):
+        """ Creates a timecourse subset for every timecourse label of the study.
+
+        The subsets, data points and dimensions of all timecourses are created with a few bulk inserts.
+
+        :return: pks of the created subsets
+        """
+        study = self.context["study"]
+        outputs = study.outputs.filter(normed=True, output_type=Output.OutputTypes.Timecourse)
+        label_outputs = OrderedDict()
+        for output_pk, label in outputs.order_by("label", "pk").values_list("pk", "label"):
+            label_outputs.setdefault(label, []).append(output_pk)
+        if not label_outputs:
+            return []
+
+        for label, output_pks in label_outputs.items():
+            if len(output_pks) == 1:
+                raise serializers.ValidationError(
+                    f"Timecourses require at least two outputs, but only a single output exists in timecourse. "
+                    f"Encode the label <{label}> as 'output_type=output' instead of 'output_type=timecourse'.")
+
+        data_instance = Data.objects.create(
+            name=AUTOGENERATED_TIMECOURSES, data_type=Data.DataTypes.Timecourse, dataset=dataset_instance)
+        subsets = SubSet.objects.bulk_create(
+            [SubSet(name=label, data=data_instance, study=study) for label in label_outputs])
+        create_timecourse_data_points(
+            study, {subset.pk: output_pks for subset, output_pks in zip(subsets, label_outputs.values())})
+        return [subset.pk for subset in subsets]
 
     def validate(self, attrs):
         self._validate_unique_names(attrs["data"])
@@ -351,6 +406,8 @@ class DataSetSerializer(ExSerializer):
                                                validated_data=validated_data,
                                                create_multiple_keys=['comments', 'descriptions'],
                                                pop=['data'])
+        self.context["timecourse_subsets"] = []
+        self.context.pop("study_outputs_frame", None)
         data_instance_container = []
         for data_single in poped_data['data']:
             data_single["dataset"] = dataset_instance
@@ -361,6 +418,11 @@ class DataSetSerializer(ExSerializer):
 
             data_instance_container.append(data_instance)
 
+        self.context.pop("study_outputs_frame", None)
+
+        timecourse_subsets = self.context.pop("timecourse_subsets")
+        timecourse_subsets.extend(SubSet.objects.filter(pk__in=self.create_timecourses(dataset_instance)))
+        SubSetSerializer(context=self.context).calculate_pks_from_timecourses(timecourse_subsets)
         dataset_instance.data.add(*data_instance_container)
         dataset_instance.save()
         return dataset_instance
@@ -370,178 +432,127 @@ class DataSetSerializer(ExSerializer):
 # Read Serializer
 ################################
 
-class TimecourseSerializer(serializers.Serializer):
-    """ Timecourse Serializer"""
-    study_sid = serializers.CharField()
-    study_name = serializers.CharField()
-    output_pk = serializers.SerializerMethodField()
-    subset_pk = serializers.IntegerField(source="pk")
-    subset_name = serializers.CharField(source="name")
-
-    intervention_pk = serializers.SerializerMethodField()
-    group_pk = serializers.SerializerMethodField()
-    individual_pk = serializers.SerializerMethodField()
-    normed = serializers.SerializerMethodField()
-
-    tissue = serializers.SerializerMethodField()
-    tissue_label = serializers.SerializerMethodField()
-
-    method = serializers.SerializerMethodField()
-    method_label = serializers.SerializerMethodField()
-
-    label = serializers.SerializerMethodField()
-
-    time = serializers.SerializerMethodField()
-    time_unit = serializers.SerializerMethodField()
-
-    measurement_type = serializers.SerializerMethodField()
-    measurement_type_label = serializers.SerializerMethodField()
-    choice = serializers.SerializerMethodField()
-    choice_label = serializers.SerializerMethodField()
-
-    substance = serializers.SerializerMethodField()
-    substance_label = serializers.SerializerMethodField()
-
-    value = serializers.SerializerMethodField()
-    mean = serializers.SerializerMethodField()
-    median = serializers.SerializerMethodField()
-    min = serializers.SerializerMethodField()
-    max = serializers.SerializerMethodField()
-    sd = serializers.SerializerMethodField()
-    se = serializers.SerializerMethodField()
-    cv = serializers.SerializerMethodField()
-    unit = serializers.SerializerMethodField()
-
-    # @cached_property
-    # def json_object(self):
-    #    return json.dumps(self.instance.to_dict())
-
-    @lru_cache(maxsize=128)
-    def _get_general(self, obj):
-        """ This function reshapes and reformats the outputs to a Pandas DataFrame. """
-
-        obj = [v["point"][0] for v in json.loads(obj)["array"]]
-        result = pd.DataFrame(obj)
-        return result.where(result.notnull(), None)
-
-    def _get_field(self, obj, field):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result[field].isnull().all():
-            return None
-        return list(result[field].values)
-
-    def get_output_pk(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        return self._get_field(obj, "pk")
-
-    def get_intervention_pk(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        return [i["pk"] for i in result["interventions"].iloc[0]]
-
-    def get_group_pk(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["group"][0]:
-            return result["group"][0]["pk"]
-
-    def get_individual_pk(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["individual"][0]:
-            return result["individual"][0]["pk"]
-
-    def get_normed(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        return result["normed"][0]
-
-    def get_tissue(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["tissue"][0]:
-            return result["tissue"][0]["sid"]
-
-    def get_tissue_label(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["tissue"][0]:
-            return result["tissue"][0]["label"]
-
-    def get_method(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["method"][0]:
-            return result["method"][0]["sid"]
-
-    def get_method_label(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["method"][0]:
-            return result["method"][0]["label"]
-
-    def get_label(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        return result["label"][0]
-
-    def get_time(self, obj):
-        return self._get_field(obj, "time")
-
-    def get_time_unit(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        return result["time_unit"][0]
-
-    def get_measurement_type(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        return result["measurement_type"][0]["sid"]
-
-    def get_measurement_type_label(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        return result["measurement_type"][0]["label"]
-
-    def get_choice(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["choice"][0]:
-            return result["choice"][0]["sid"]
-
-    def get_choice_label(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["choice"][0]:
-            return result["choice"][0]["label"]
+TIMECOURSE_ARRAY_FIELDS = ["pk", "time", "value", "mean", "median", "min", "max", "sd", "se", "cv"]
 
-    def get_substance(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["substance"][0]:
-            return result["substance"][0]["sid"]
 
-    def get_substance_label(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        if result["substance"][0]:
-            return result["substance"][0]["label"]
-
-    def get_value(self, obj):
-        return self._get_field(obj, "value")
-
-    def get_mean(self, obj):
-        return self._get_field(obj, "mean")
-
-    def get_median(self, obj):
-        return self._get_field(obj, "median")
-
-    def get_min(self, obj):
-        return self._get_field(obj, "min")
+class TimecourseSerializer(serializers.Serializer):
+    """ Timecourse Serializer
 
-    def get_max(self, obj):
-        return self._get_field(obj, "max")
+    Every elastic hit is parsed exactly once, all fields are derived from the parsed points.
+    """
+    study_sid = serializers.CharField(read_only=True)
+    study_name = serializers.CharField(read_only=True)
+    output_pk = serializers.ListField(read_only=True)
+    subset_pk = serializers.IntegerField(source="pk", read_only=True)
+    subset_name = serializers.CharField(source="name", read_only=True)
+
+    intervention_pk = serializers.ListField(read_only=True)
+    group_pk = serializers.IntegerField(read_only=True)
+    individual_pk = serializers.IntegerField(read_only=True)
+    normed = serializers.BooleanField(read_only=True)
+
+    tissue = serializers.CharField(read_only=True)
+    tissue_label = serializers.CharField(read_only=True)
+
+    method = serializers.CharField(read_only=True)
+    method_label = serializers.CharField(read_only=True)
+
+    label = serializers.CharField(read_only=True)
+
+    time = serializers.ListField(read_only=True)
+    time_unit = serializers.CharField(read_only=True)
+
+    measurement_type = serializers.CharField(read_only=True)
+    measurement_type_label = serializers.CharField(read_only=True)
+    choice = serializers.CharField(read_only=True)
+    choice_label = serializers.CharField(read_only=True)
+
+    substance = serializers.CharField(read_only=True)
+    substance_label = serializers.CharField(read_only=True)
+
+    value = serializers.ListField(read_only=True)
+    mean = serializers.ListField(read_only=True)
+    median = serializers.ListField(read_only=True)
+    min = serializers.ListField(read_only=True)
+    max = serializers.ListField(read_only=True)
+    sd = serializers.ListField(read_only=True)
+    se = serializers.ListField(read_only=True)
+    cv = serializers.ListField(read_only=True)
+    unit = serializers.CharField(read_only=True)
 
-    def get_sd(self, obj):
-        return self._get_field(obj, "sd")
+    class Meta:
+        fields = ["study_sid", "study_name", "output_pk", "intervention_pk", "group_pk", "individual_pk", "normed",
+                  "calculated"] + OUTPUT_FIELDS + MEASUREMENTTYPE_FIELDS
 
-    def get_se(self, obj):
-        return self._get_field(obj, "se")
+    @staticmethod
+    def points(instance):
+        """ First point of every data point of the timecourse. """
+        if hasattr(instance, "to_dict"):
+            instance = instance.to_dict()
+        return [v["point"][0] for v in instance["array"]]
 
-    def get_cv(self, obj):
-        return self._get_field(obj, "cv")
+    @staticmethod
+    def _null(value):
+        if isinstance(value, float) and np.isnan(value):
+            return None
+        return value
 
-    def get_unit(self, obj):
-        result = self._get_general(json.dumps(obj.to_dict()))
-        return result["unit"][0]
+    @classmethod
+    def columns(cls, points):
+        """ Columns of the array fields for the given points. """
+        return {field: [cls._null(point.get(field)) for point in points] for field in TIMECOURSE_ARRAY_FIELDS}
 
-    class Meta:
-        fields = ["study_sid", "study_name", "output_pk", "intervention_pk", "group_pk", "individual_pk", "normed",
-                  "calculated"] + OUTPUT_FIELDS + MEASUREMENTTYPE_FIELDS
+    @staticmethod
+    def _array(values):
+        if all(value is None for value in values):
+            return None
+        return values
+
+    def timecourse_representation(self, instance, points, columns):
+        point = points[0] if points else {}
+
+        def node(key, attr):
+            info = point.get(key)
+            if info:
+                return info[attr]
+
+        return OrderedDict([
+            ("study_sid", instance["study_sid"]),
+            ("study_name", instance["study_name"]),
+            ("output_pk", self._array(columns["pk"])),
+            ("subset_pk", instance["pk"]),
+            ("subset_name", instance["name"]),
+            ("intervention_pk", [i["pk"] for i in point.get("interventions") or []]),
+            ("group_pk", node("group", "pk")),
+            ("individual_pk", node("individual", "pk")),
+            ("normed", point.get("normed")),
+            ("tissue", node("tissue", "sid")),
+            ("tissue_label", node("tissue", "label")),
+            ("method", node("method", "sid")),
+            ("method_label", node("method", "label")),
+            ("label", point.get("label")),
+            ("time", self._array(columns["time"])),
+            ("time_unit", point.get("time_unit")),
+            ("measurement_type", node("measurement_type", "sid")),
+            ("measurement_type_label", node("measurement_type", "label")),
+            ("choice", node("choice", "sid")),
+            ("choice_label", node("choice", "label")),
+            ("substance", node("substance", "sid")),
+            ("substance_label", node("substance", "label")),
+            ("value", self._array(columns["value"])),
+            ("mean", self._array(columns["mean"])),
+            ("median", self._array(columns["median"])),
+            ("min", self._array(columns["min"])),
+            ("max", self._array(columns["max"])),
+            ("sd", self._array(columns["sd"])),
+            ("se", self._array(columns["se"])),
+            ("cv", self._array(columns["cv"])),
+            ("unit", point.get("unit")),
+        ])
+
+    def to_representation(self, instance):
+        points = self.points(instance)
+        return self.timecourse_representation(instance, points, self.columns(points))
 
 
 class SubSetElasticSerializer(DocumentSerializer):
@@ -11,7 +11,7 @@ from elasticsearch_dsl import analyzer, token_filter, Q
 from pkdb_app.studies.models import IdCollection
 
 from pkdb_app.users.models import PUBLIC
-from pkdb_app.users.permissions import user_group
+from pkdb_app.users.permissions import permission_context
 
 elastic_settings = {
     'number_of_shards': 1,
@@ -174,7 +174,8 @@ class AccessView(BaseDocumentViewSet):
         return resource
 
     def get_queryset(self):
-        group = user_group(self.request.user)
+        context = permission_context(self.request)
+        group = context.group
         if hasattr(self, "initial_data"):
             id_queries = [Q('term', pk=pk) for pk in self.initial_data]
             if len(id_queries) > 0:
@@ -195,7 +196,9 @@ class AccessView(BaseDocumentViewSet):
             )
 
         if group == "basic":
-            return self.search.query(Q('term', access__raw=PUBLIC) | Q('term', allowed_users__raw=self.request.user.username))
+            # documents of public studies and of the studies the user is member of
+            member_studies = Q('terms', **{self.document.study_sid_field: sorted(context.member_study_sids)})
+            return self.search.query(Q('term', access__raw=PUBLIC) | member_studies)
         elif group == "anonymous":
             return self.search.query(Q('term', access__raw=PUBLIC))
         elif group in ["admin", "reviewer"]:
@@ -0,0 +1,74 @@
+"""
+Sets of primary keys used by the filter endpoint.
+
+Id sets are represented as sorted numpy arrays of unique integers, which allows
+fast intersections and unions in process. Only the final sets are send to
+postgres as a single array parameter via the `any` lookup
+(`field = ANY(%s)`) instead of huge `IN (...)` lists of literals.
+"""
+import zlib
+from typing import Iterable
+
+import numpy as np
+from django.db.models import Field, Lookup
+
+
+def id_set(pks: Iterable[int]) -> np.ndarray:
+    """ Sorted array of unique ids. None values are ignored. """
+    if isinstance(pks, np.ndarray):
+        return np.unique(pks.astype(np.int64, copy=False))
+    return np.unique(np.fromiter((pk for pk in pks if pk is not None), dtype=np.int64))
+
+
+def intersection(*id_sets: np.ndarray) -> np.ndarray:
+    """ Intersection of sorted id sets. """
+    result = id_sets[0]
+    for ids in id_sets[1:]:
+        result = np.intersect1d(result, ids, assume_unique=True)
+    return result
+
+
+def union(*id_sets: np.ndarray) -> np.ndarray:
+    """ Union of sorted id sets. """
+    result = id_sets[0]
+    for ids in id_sets[1:]:
+        result = np.union1d(result, ids)
+    return result
+
+
+def to_list(ids: Iterable[int]) -> list:
+    """ List of python integers, e.g. for database parameters or json. """
+    if isinstance(ids, np.ndarray):
+        return ids.tolist()
+    return [int(pk) for pk in ids]
+
+
+def to_bytes(ids: Iterable[int]) -> bytes:
+    """ Compact binary representation of an id set.
+
+    The sorted ids are delta encoded and compressed, which results in roughly
+    one byte per id for dense id sets.
+    """
+    deltas = np.diff(id_set(ids), prepend=0).astype(np.uint32)
+    return zlib.compress(deltas.tobytes())
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    """ Id set from the binary representation created by 'to_bytes'. """
+    deltas = np.frombuffer(zlib.decompress(bytes(data)), dtype=np.uint32)
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+@Field.register_lookup
+class AnyLookup(Lookup):
+    """ Lookup `field__any=ids` which compares a field against an array parameter. """
+    lookup_name = "any"
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        return "%s", [to_list(value)]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} = ANY({rhs})", lhs_params + rhs_params
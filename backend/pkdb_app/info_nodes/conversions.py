@@ -0,0 +1,93 @@
+"""
+Precompiled unit conversions for the normalization of values.
+
+A conversion is compiled once for every (measurement_type, unit, substance mass)
+and reduces the normalization to float multiplications. The compiled
+conversions are kept in a bounded in-process cache, which is cleared when
+info nodes change in any process (see info_nodes.version and the signals in info_nodes.models).
+"""
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+from django.conf import settings
+
+from pkdb_app.info_nodes.units import ureg
+from pkdb_app.info_nodes.version import info_nodes_version
+
+Conversion = namedtuple("Conversion", ["substance_factor", "substance_unit", "factor", "offset", "unit"])
+Conversion.__doc__ = """ Conversion of values in a unit to the normalized unit.
+
+1. If substance_factor is not None the values are multiplied by the substance factor and the unit is changed to
+   substance_unit (removes the substance dimension via the molar mass).
+2. If factor is not None the values are converted via 'value * factor + offset' and the unit is changed to unit.
+"""
+
+
+def compile_conversion(measurement_type, unit: str, mass: float = None) -> Conversion:
+    """ Compiles the conversion of values with given unit for the measurement type.
+
+    :param measurement_type: MeasurementType
+    :param unit: unit of the values
+    :param mass: molar mass of the substance in [g/mole] (optional)
+    """
+    substance_factor = None
+    substance_unit = unit
+
+    if mass:
+        p_unit = measurement_type.p_unit(unit)
+        dimension = p_unit.dimensionality.get('[substance]')
+        if dimension != 0:
+            quantity = p_unit * (ureg("g/mol") * mass) ** dimension
+            if ureg(str(quantity.units)) != ureg(unit):
+                substance_factor = quantity.magnitude
+                substance_unit = str(quantity.units)
+
+    factor = None
+    offset = None
+    norm_unit = None
+    if not measurement_type.is_norm_unit(substance_unit):
+        p_unit = measurement_type.p_unit(substance_unit)
+        p_norm_unit = measurement_type.norm_unit(substance_unit)
+        offset = (0 * p_unit).to(p_norm_unit).magnitude
+        factor = (1 * p_unit).to(p_norm_unit).magnitude - offset
+        norm_unit = str(p_norm_unit)
+
+    return Conversion(substance_factor, substance_unit, factor, offset, norm_unit)
+
+
+class UnitConversions(object):
+    """ Bounded LRU cache of compiled conversions. """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._conversions = OrderedDict()
+        self._version = None
+        self._lock = Lock()
+
+    def get(self, measurement_type, unit: str, mass: float = None) -> Conversion:
+        key = (measurement_type.pk, unit, mass)
+        version = info_nodes_version.current()
+        with self._lock:
+            if self._version != version:
+                self._conversions.clear()
+                self._version = version
+            conversion = self._conversions.get(key)
+            if conversion is not None:
+                self._conversions.move_to_end(key)
+                return conversion
+
+        conversion = compile_conversion(measurement_type, unit, mass)
+        with self._lock:
+            # not cached if the info nodes changed in the meantime
+            if self._version == version:
+                self._conversions[key] = conversion
+                if len(self._conversions) > self.maxsize:
+                    self._conversions.popitem(last=False)
+        return conversion
+
+    def clear(self):
+        with self._lock:
+            self._conversions.clear()
+
+
+unit_conversions = UnitConversions(maxsize=settings.UNIT_CONVERSIONS_CACHE_SIZE)
@@ -6,11 +6,17 @@ from numbers import Number
 import pint
 
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from pint import UndefinedUnitError
 
 from pkdb_app.behaviours import Sidable
+from pkdb_app.info_nodes.conversions import unit_conversions
+from pkdb_app.info_nodes.registry import info_node_registry
 from pkdb_app.info_nodes.units import ureg
+from pkdb_app.info_nodes.version import info_nodes_version
 from pkdb_app.utils import CHAR_MAX_LENGTH, CHAR_MAX_LENGTH_LONG, \
     _validate_required_key_and_value
 from rest_framework import serializers
@@ -313,17 +319,18 @@ class MeasurementType(AbstractInfoNode):
         if choice:
             if self.info_node.dtype in [self.info_node.DTypes.Categorical, self.info_node.DTypes.Boolean,
                                         self.info_node.DTypes.NumericCategorical]:
-                if not self.is_valid_choice(choice):
+                choices = info_node_registry.choices(self.info_node_id)
+                if choice not in choices:
                     msg = f"The choice `{choice}` is not a valid choice for measurement type `{self.info_node.name}`. " \
                           f"Allowed choices are: `{list(self.choices_list())}`."
                     raise ValueError({"choice": msg})
-                return self.choices.get(info_node__name=choice)
+                return choices[choice]
             else:
                 msg = f"The field `choice` is not allowed for measurement type `{self.info_node.name}`. " \
                       f"For numerical values the fields `value`, `mean` or `median` are used. " \
                       f"For encoding substances use the `substance` field."
                 raise ValueError({"choice": msg})
-        elif self.choices.exists():
+        elif info_node_registry.choices(self.info_node_id):
             msg = f"{choice}. A choice is required for `{self.info_node.name}`." \
                   f" Allowed choices are: `{list(self.choices_list())}`."
             raise ValueError({"choice": msg})
@@ -449,3 +456,49 @@ class Substance(AbstractInfoNode):
     @property
     def interventions_normed(self):
         return self.intervention_set.filter(normed=True)
+
+
+class InfoNodesVersion(models.Model):
+    """ Version of the info nodes.
+
+    Single row which is incremented on every change of info nodes. The in-memory copies
+    of the info nodes in every process are reloaded when the version changes (see info_nodes.version).
+    """
+    PK = 1
+
+    version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=cls.PK).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def increment(cls):
+        if not cls.objects.filter(pk=cls.PK).update(version=F("version") + 1):
+            cls.objects.get_or_create(pk=cls.PK, defaults={"version": 1})
+
+
+@receiver([post_save, post_delete], sender=InfoNode)
+@receiver([post_save, post_delete], sender=MeasurementType)
+@receiver([post_save, post_delete], sender=Substance)
+@receiver([post_save, post_delete], sender=Unit)
+@receiver([post_save, post_delete], sender=Tissue)
+@receiver([post_save, post_delete], sender=Method)
+@receiver([post_save, post_delete], sender=Route)
+@receiver([post_save, post_delete], sender=Form)
+@receiver([post_save, post_delete], sender=Application)
+@receiver([post_save, post_delete], sender=Choice)
+@receiver(m2m_changed, sender=MeasurementType.units.through)
+@receiver(m2m_changed, sender=Choice.measurement_types.through)
+def clear_info_nodes(sender, **kwargs):
+    """ Clears the info node registry and the compiled unit conversions.
+
+    The copies of this process are cleared directly, the copies of all other processes
+    are reloaded via the shared version, which is incremented once per transaction.
+    """
+    # m2m changes are handled once after the change
+    if "action" in kwargs and not kwargs["action"].startswith("post_"):
+        return
+    info_node_registry.clear()
+    unit_conversions.clear()
+    info_nodes_version.increment_on_commit()
@@ -0,0 +1,122 @@
+"""
+Process wide registry of info nodes.
+
+Info nodes are read by every upload (measurement types, substances, tissues, ...),
+but rarely written. The registry loads all info nodes with their specific instances
+once and resolves names and sids in memory. It is reloaded when info nodes change
+in any process (see info_nodes.version and the signals in info_nodes.models).
+"""
+from threading import Lock
+
+from django.apps import apps
+
+from pkdb_app import utils
+from pkdb_app.info_nodes.version import info_nodes_version
+
+SPECIFIC_TYPES = ["measurement_type", "substance", "tissue", "method", "route", "form", "application", "choice"]
+
+
+class InfoNodeRegistry(object):
+    """ Lazily loaded map of name/sid -> InfoNode per ntype. """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._nodes = None
+        self._version = None
+
+    def _load(self):
+        from pkdb_app.info_nodes.models import InfoNode
+
+        nodes = {"name": {}, "sid": {}, "pk": {}, "choices": {}}
+        for info_node in InfoNode.objects.select_related(*SPECIFIC_TYPES):
+            nodes["name"][(info_node.ntype, info_node.name)] = info_node
+            nodes["sid"][(info_node.ntype, info_node.sid)] = info_node
+            if info_node.ntype in SPECIFIC_TYPES:
+                specific = getattr(info_node, info_node.ntype, None)
+                if specific is not None:
+                    nodes["pk"][(info_node.ntype, specific.pk)] = specific
+
+        # choices of measurement types (keyed by the info node of the measurement type)
+        Choice = apps.get_model("info_nodes.Choice")
+        choices = {choice.pk: choice for choice in nodes["pk"].values() if isinstance(choice, Choice)}
+        for choice_pk, info_node_pk in Choice.measurement_types.through.objects.values_list("choice_id",
+                                                                                            "infonode_id"):
+            choice = choices.get(choice_pk)
+            if choice is not None:
+                nodes["choices"].setdefault(info_node_pk, {})[choice.info_node.name] = choice
+        return nodes
+
+    @property
+    def nodes(self):
+        version = info_nodes_version.current()
+        nodes = self._nodes
+        if nodes is None or self._version != version:
+            with self._lock:
+                if self._nodes is None or self._version != version:
+                    self._nodes = self._load()
+                    self._version = version
+                nodes = self._nodes
+        return nodes
+
+    def clear(self):
+        with self._lock:
+            self._nodes = None
+
+    def get(self, ntype: str, value: str, field: str = "name"):
+        """ InfoNode of given ntype by name or sid.
+
+        :raises InfoNode.DoesNotExist:
+        """
+        from pkdb_app.info_nodes.models import InfoNode
+
+        try:
+            return self.nodes[field][(ntype, value)]
+        except KeyError:
+            raise InfoNode.DoesNotExist(f"{ntype} with {field}=<{value}> does not exist.")
+
+    def specific(self, ntype: str, value: str, field: str = "name"):
+        """ Specific instance (e.g. MeasurementType, Substance) by name or sid of the info node."""
+        return getattr(self.get(ntype, value, field=field), ntype)
+
+    def specific_by_pk(self, ntype: str, pk):
+        """ Specific instance (e.g. MeasurementType, Substance) by its primary key, None if pk is None."""
+        if pk is None:
+            return None
+        try:
+            return self.nodes["pk"][(ntype, pk)]
+        except KeyError:
+            from pkdb_app.info_nodes.models import InfoNode
+            raise InfoNode.DoesNotExist(f"{ntype} with pk=<{pk}> does not exist.")
+
+    def measurement_type(self, name: str):
+        return self.specific("measurement_type", name)
+
+    def choices(self, measurement_type_info_node_pk) -> dict:
+        """ Choices of a measurement type as dictionary name -> Choice."""
+        return self.nodes["choices"].get(measurement_type_info_node_pk, {})
+
+
+info_node_registry = InfoNodeRegistry()
+
+
+class InfoNodeSlugRelatedField(utils.SlugRelatedField):
+    """ SlugRelatedField for info nodes of a given ntype which resolves the slug via the registry. """
+
+    def __init__(self, ntype: str, **kwargs):
+        from pkdb_app.info_nodes.models import InfoNode
+
+        self.ntype = ntype
+        kwargs.setdefault("slug_field", "name")
+        if not kwargs.get("read_only"):
+            kwargs.setdefault("queryset", InfoNode.objects.filter(ntype=ntype))
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        from pkdb_app.info_nodes.models import InfoNode
+
+        if self.slug_field not in ["name", "sid"]:
+            return super().to_internal_value(data)
+        try:
+            return info_node_registry.get(self.ntype, str(data), field=self.slug_field)
+        except InfoNode.DoesNotExist:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=str(data))
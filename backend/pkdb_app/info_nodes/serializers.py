@@ -2,6 +2,7 @@ from rest_framework import serializers
 
 from pkdb_app import utils
 from pkdb_app.info_nodes.documents import InfoNodeDocument
+from pkdb_app.info_nodes.registry import InfoNodeSlugRelatedField
 from pkdb_app.info_nodes.models import InfoNode, Synonym, Annotation, Unit, MeasurementType, Substance, Choice, Route, \
     Form, Tissue, Application, Method, CrossReference
 from pkdb_app.serializers import WrongKeyValidationSerializer, ExSerializer, SidNameLabelSerializer
@@ -14,17 +15,15 @@ class EXMeasurementTypeableSerializer(ExSerializer):
 
 
 class MeasurementTypeableSerializer(EXMeasurementTypeableSerializer):
-    substance = utils.SlugRelatedField(
-        slug_field="name",
-        queryset=InfoNode.objects.filter(ntype=InfoNode.NTypes.Substance),
+    substance = InfoNodeSlugRelatedField(
+        ntype=InfoNode.NTypes.Substance,
         read_only=False,
         required=False,
         allow_null=True,
     )
 
-    measurement_type = utils.SlugRelatedField(
-        slug_field="name",
-        queryset=InfoNode.objects.filter(ntype=InfoNode.NTypes.MeasurementType)
+    measurement_type = InfoNodeSlugRelatedField(
+        ntype=InfoNode.NTypes.MeasurementType,
     )
 
     choice = serializers.CharField(allow_null=True)
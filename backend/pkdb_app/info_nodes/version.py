@@ -0,0 +1,52 @@
+"""
+Version of the info nodes shared by all processes.
+
+The in-memory copies of info nodes (see info_nodes.registry) are kept per process.
+Changes of info nodes increment the version in the InfoNodesVersion row, every process
+compares the version of its copies with the stored version and reloads them on changes.
+The stored version is read at most every 'INFO_NODES_VERSION_INTERVAL' seconds.
+"""
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+
+class SharedVersion(object):
+    """ Shared version of the info nodes with the last read value. """
+
+    def __init__(self):
+        self._version = None
+        self._checked = 0.0
+
+    def current(self) -> int:
+        now = time.monotonic()
+        version = self._version
+        if version is None or now - self._checked > settings.INFO_NODES_VERSION_INTERVAL:
+            from pkdb_app.info_nodes.models import InfoNodesVersion
+
+            version = InfoNodesVersion.current()
+            self._version = version
+            self._checked = now
+        return version
+
+    def increment(self):
+        from pkdb_app.info_nodes.models import InfoNodesVersion
+
+        InfoNodesVersion.increment()
+        # read again on next use
+        self._version = None
+
+    def increment_on_commit(self):
+        """ Increments the version once on commit of the current transaction.
+
+        All changes of info nodes within a transaction (e.g. the upload of info nodes)
+        result in a single increment.
+        """
+        connection = transaction.get_connection()
+        if connection.in_atomic_block and any(entry[1] == self.increment for entry in connection.run_on_commit):
+            return
+        transaction.on_commit(self.increment)
+
+
+info_nodes_version = SharedVersion()
@@ -1,5 +1,6 @@
 from collections import namedtuple
 
+from django.db import transaction
 from django_elasticsearch_dsl_drf.constants import LOOKUP_QUERY_IN, LOOKUP_QUERY_EXCLUDE
 from django_elasticsearch_dsl_drf.filter_backends import FilteringFilterBackend, IdsFilterBackend, \
     OrderingFilterBackend, MultiMatchSearchFilterBackend, CompoundSearchFilterBackend
@@ -36,6 +37,20 @@ class InfoNodeViewSet(viewsets.ModelViewSet):
 
         return super().get_serializer(*args, **kwargs)
 
+    # changes of info nodes are saved in a single transaction, so the shared
+    # info nodes version is incremented once per request (see info_nodes.version)
+    @transaction.atomic
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+
 
 class InfoNodeElasticViewSet(BaseDocumentViewSet):
     pagination_class = CustomPagination
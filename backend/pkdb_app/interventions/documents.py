@@ -51,6 +51,8 @@ class InterventionDocument(Document):
     cv = fields.FloatField()
     unit = string_field('unit')
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study__sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
         properties={
@@ -10,6 +10,7 @@ from pkdb_app import utils
 from pkdb_app.behaviours import VALUE_FIELDS_NO_UNIT, \
     MEASUREMENTTYPE_FIELDS, map_field, EX_MEASUREMENTTYPE_FIELDS
 from pkdb_app.info_nodes.models import InfoNode
+from pkdb_app.info_nodes.registry import InfoNodeSlugRelatedField
 from pkdb_app.info_nodes.serializers import MeasurementTypeableSerializer
 from pkdb_app.subjects.serializers import EXTERN_FILE_FIELDS
 from ..comments.serializers import DescriptionSerializer, CommentSerializer, DescriptionElasticSerializer, \
@@ -54,20 +55,17 @@ OUTPUT_MAP_FIELDS = map_field(OUTPUT_FIELDS)
 
 
 class InterventionSerializer(MeasurementTypeableSerializer):
-    route = utils.SlugRelatedField(
-        slug_field="name",
-        required=False,
-        queryset=InfoNode.objects.filter(ntype=InfoNode.NTypes.Route))
-
-    application = utils.SlugRelatedField(
-        slug_field="name",
-        required=False,
-        queryset=InfoNode.objects.filter(ntype=InfoNode.NTypes.Application))
-
-    form = utils.SlugRelatedField(
-        slug_field="name",
-        required=False,
-        queryset=InfoNode.objects.filter(ntype=InfoNode.NTypes.Form))
+    route = InfoNodeSlugRelatedField(
+        ntype=InfoNode.NTypes.Route,
+        required=False)
+
+    application = InfoNodeSlugRelatedField(
+        ntype=InfoNode.NTypes.Application,
+        required=False)
+
+    form = InfoNodeSlugRelatedField(
+        ntype=InfoNode.NTypes.Form,
+        required=False)
 
     class Meta:
         model = Intervention
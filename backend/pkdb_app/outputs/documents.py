@@ -51,6 +51,8 @@ class OutputDocument(Document):
     label = string_field('label')
     output_type = string_field('output_type')
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study__sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
         properties={
@@ -122,6 +124,8 @@ class OutputInterventionDocument(Document):
 
     # for permissions
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study_sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
         properties={
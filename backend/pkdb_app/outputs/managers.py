@@ -8,3 +8,31 @@ class OutputManager(models.Manager):
     def create(self, *args, **kwargs):
         output, _ = _create(model_manager=super(), validated_data=kwargs, add_multiple_keys=['interventions'])
         return output
+
+
+class OutputFactManager(models.Manager):
+    def refresh_study(self, study):
+        """ Replaces the facts of the study by the facts of its current normed outputs."""
+        from .models import Output
+
+        self.filter(study=study).delete()
+        outputs = Output.objects.filter(study=study, normed=True).values("id", "interventions__id", "group_id",
+                                                                          "individual_id", "subset_id",
+                                                                          "output_type", "measurement_type_id",
+                                                                          "substance_id")
+        facts = [
+            self.model(
+                study_id=study.pk,
+                output_id=output["id"],
+                intervention_id=output["interventions__id"],
+                group_id=output["group_id"],
+                individual_id=output["individual_id"],
+                subset_id=output["subset_id"],
+                output_type=output["output_type"],
+                measurement_type_id=output["measurement_type_id"],
+                substance_id=output["substance_id"],
+            )
+            for output in outputs.iterator()
+        ]
+        self.bulk_create(facts, batch_size=5000)
+        return len(facts)
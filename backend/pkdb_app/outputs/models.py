@@ -14,7 +14,7 @@ from pkdb_app.subjects.models import Group, DataFile, Individual
 from django.utils.translation import gettext_lazy as _
 
 from .managers import (
-    OutputManager
+    OutputManager, OutputFactManager
 )
 from ..behaviours import (
     Externable, Accessible)
@@ -333,4 +333,31 @@ class OutputIntervention(Accessible, models.Model):
 
     @property
     def calculated(self):
-        return self.output.calculated
\ No newline at end of file
+        return self.output.calculated
+
+class OutputFact(models.Model):
+    """ Denormalized fact table of normed outputs.
+
+    One row per normed output and intervention (intervention is null for outputs
+    without interventions). Used by the concise filter queries which otherwise join
+    outputs, output interventions and subsets. Rows are refreshed per study after
+    the relations of the study are created (see OutputFactManager.refresh_study).
+    """
+    study = models.ForeignKey('studies.Study', on_delete=models.CASCADE, related_name="output_facts")
+    output = models.ForeignKey(Output, on_delete=models.CASCADE, related_name="facts")
+    intervention = models.ForeignKey(Intervention, null=True, on_delete=models.CASCADE, related_name="+")
+    group = models.ForeignKey(Group, null=True, on_delete=models.CASCADE, related_name="+")
+    individual = models.ForeignKey(Individual, null=True, on_delete=models.CASCADE, related_name="+")
+    subset = models.ForeignKey('data.Subset', null=True, on_delete=models.CASCADE, related_name="+")
+    output_type = models.CharField(max_length=CHAR_MAX_LENGTH, choices=Output.OutputTypes.choices)
+    measurement_type = models.ForeignKey('info_nodes.MeasurementType', on_delete=models.CASCADE, related_name="+")
+    substance = models.ForeignKey('info_nodes.Substance', null=True, on_delete=models.CASCADE, related_name="+")
+
+    objects = OutputFactManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["study", "output"]),
+            models.Index(fields=["output_type", "subset"]),
+            models.Index(fields=["measurement_type", "substance"]),
+        ]
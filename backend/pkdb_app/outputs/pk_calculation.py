@@ -1,93 +1,192 @@
 """
 Calculate pharmacokinetics
+
+The calculation is split in three steps, so that the pharmacokinetics of all
+timecourses of a study can be calculated in parallel:
+
+1. `pk_input_from_timecourse` collects the input of the calculation from the database
+2. `calculate_pk` runs the CPU heavy calculation (in worker processes)
+3. `pkoutputs_from_pk` creates the outputs from the calculated parameters
 """
-from typing import List, Dict
-from rest_framework import serializers
 import logging
+import traceback
 import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
 import numpy as np
 from django.apps import apps
+from django.conf import settings
 from pkdb_app.info_nodes.units import ureg
+from pkdb_app.info_nodes.registry import info_node_registry
 from pkdb_analysis.pk import pharmacokinetics
 
 logger = logging.getLogger(__name__)
 
 MeasurementType = apps.get_model('info_nodes.MeasurementType')
-Substance = apps.get_model('info_nodes.Substance')
-Method = apps.get_model('info_nodes.Method')
-Tissue = apps.get_model('info_nodes.Tissue')
 Output = apps.get_model('outputs.Output')
 
 Subset = apps.get_model('data.Subset')
 Individual = apps.get_model('subjects.Individual')
 Group = apps.get_model('subjects.Group')
 
+# pharmacokinetic parameters and measurement types of the calculated outputs
+PK_MEASUREMENT_TYPES = {
+    "auc": "auc_end",
+    "aucinf": "auc_inf",
+    "cl": "clearance",
+    "cmax": "cmax",
+    "kel": "kel",
+    "thalf": "thalf",
+    "tmax": "tmax",
+    "vd": "vd",
+    "vdss": "vd_ss",
+}
+
+
+def pkoutputs_from_timecourses(subsets: List[Subset]) -> List[Tuple[Subset, List[Dict], Optional[str]]]:
+    """Calculates pharmacokinetics outputs for multiple timecourses.
+
+    The input is collected for all subsets first, the calculations run in a
+    process pool with `settings.PK_CALCULATION_WORKERS` processes.
+
+    :param subsets: list of models.SubSet
+    :return: list of (subset, outputs, error) with the formatted traceback as error if the calculation failed
+    """
+    pk_inputs = []
+    for subset in subsets:
+        try:
+            pk_inputs.append(pk_input_from_timecourse(subset))
+        except Exception:
+            pk_inputs.append(traceback.format_exc())
+
+    results = iter(_calculate_pks([pk_input[2] for pk_input in pk_inputs if isinstance(pk_input, tuple)]))
 
-def pkoutputs_from_timecourse(subset:Subset) -> List[Dict]:
-    """Calculates pharmacokinetics outputs for timecourse.
+    pkoutputs = []
+    for subset, pk_input in zip(subsets, pk_inputs):
+        if pk_input is None:
+            pkoutputs.append((subset, [], None))
+            continue
+        if isinstance(pk_input, str):
+            pkoutputs.append((subset, [], pk_input))
+            continue
+
+        timecourse, dosing, variables = pk_input
+        result = next(results)
+        if "error" in result:
+            pkoutputs.append((subset, [], result["error"]))
+            continue
+        try:
+            pkoutputs.append((subset, pkoutputs_from_pk(timecourse, dosing, variables["ctype"], result["pk"]), None))
+        except Exception:
+            pkoutputs.append((subset, [], traceback.format_exc()))
+
+    return pkoutputs
+
+
+def _calculate_pks(variables_list: List[Dict]) -> List[Dict]:
+    workers = min(settings.PK_CALCULATION_WORKERS, len(variables_list))
+    if workers <= 1:
+        return [calculate_pk(variables) for variables in variables_list]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(calculate_pk, variables_list))
+
+
+def pk_input_from_timecourse(subset: Subset) -> Optional[Tuple[Dict, object, Dict]]:
+    """Collects the input for the pharmacokinetics calculation of the timecourse.
 
     :param subset: models.SubSet
-    :return:
+    :return: (timecourse, dosing, variables) or None if no pharmacokinetics are calculated
     """
-    outputs = []
     dosing = subset.get_single_dosing()
-    timecourse = subset.timecourse
     # dosing information must exist
     if not dosing:
-        return outputs
+        return None
 
+    timecourse = subset.timecourse
     # pharmacokinetics are only calculated on normalized concentrations
+    if timecourse["measurement_type_name"] != "concentration":
+        return None
 
-    if timecourse["measurement_type_name"] == "concentration":
-        variables = _timecourse_to_pkdict(timecourse, dosing)
-        ctype = variables.pop("ctype", None)
+    variables = _timecourse_to_pkdict(timecourse, dosing)
+    variables["single_dose"] = (dosing.application.info_node.name == "single dose"
+                                and timecourse["substance"] == dosing.substance.pk)
+    return timecourse, dosing, variables
 
-        if dosing.application.info_node.name == "single dose" and timecourse["substance"] == dosing.substance.pk:
-            pkinf = pharmacokinetics.TimecoursePK(**variables)
-        else:
-            _ = variables.pop("dosing", None)
-            _ = variables.pop("intervention_time", None)
-            pkinf = pharmacokinetics.TimecoursePKNoDosing(**variables)
 
-        pk = pkinf.pk
+def calculate_pk(variables: Dict) -> Dict:
+    """Calculates the pharmacokinetic parameters.
+
+    Runs in worker processes, so only picklable data is passed and returned,
+    quantities are given as (magnitude, unit) tuples.
 
-        key_mapping = {
-            "auc": MeasurementType.objects.get(info_node__name="auc_end"),
-            "aucinf": MeasurementType.objects.get(info_node__name="auc_inf"),
-            "cl": MeasurementType.objects.get(info_node__name="clearance"),
-            "cmax": MeasurementType.objects.get(info_node__name="cmax"),
-            "kel": MeasurementType.objects.get(info_node__name="kel"),
-            "thalf": MeasurementType.objects.get(info_node__name="thalf"),
-            "tmax": MeasurementType.objects.get(info_node__name="tmax"),
-            "vd": MeasurementType.objects.get(info_node__name="vd"),
-            "vdss": MeasurementType.objects.get(info_node__name="vd_ss"),
+    :param variables: dict created by `_timecourse_to_pkdict`
+    :return: dict with the parameters under 'pk' or the formatted traceback under 'error'
+    """
+    try:
+        Q_ = ureg.Quantity
+        kwargs = {
+            key: Q_(*value) if isinstance(value, tuple) else value
+            for key, value in variables.items() if key not in ["ctype", "single_dose"]
         }
+        kwargs['ureg'] = ureg  # for unit conversions
 
-        def get_or_none(id, model):
-            if id:
-                return model.objects.get(id=id)
+        if variables["single_dose"]:
+            pkinf = pharmacokinetics.TimecoursePK(**kwargs)
+        else:
+            _ = kwargs.pop("intervention_time", None)
+            pkinf = pharmacokinetics.TimecoursePKNoDosing(**kwargs)
 
-        for key in key_mapping.keys():
+        pk = pkinf.pk
+        parameters = {}
+        for key in PK_MEASUREMENT_TYPES.keys():
             pk_par = getattr(pk, key, None)
             # check that exists
             if pk_par and not np.isnan(pk_par.magnitude):
-                output_dict = {}
-                output_dict[ctype] = pk_par.magnitude
-                output_dict["unit"] = str(pk_par.units)
-                output_dict["measurement_type"] = key_mapping[key]
-                output_dict["calculated"] = True
-                output_dict["tissue"] = get_or_none(timecourse["tissue"], model=Tissue)
-                output_dict["method"] = get_or_none(timecourse["method"], model=Method)
-                output_dict["substance"] = get_or_none(id=timecourse["substance"], model=Substance)
-                output_dict["group"] =  get_or_none(id=timecourse["group"],model=Group)
-                output_dict["individual"] = get_or_none(timecourse["individual"], model=Individual)
-                output_dict["interventions"] = timecourse["interventions"]
-                output_dict["study"] = dosing.study
-                if output_dict["measurement_type"].info_node.name == "auc_end":
-                    output_dict["time"] = max(timecourse["time"])
-                    output_dict["time_unit"] = str(timecourse["time_unit"])
-
-                outputs.append(output_dict)
+                parameters[key] = (pk_par.magnitude, str(pk_par.units))
+        return {"pk": parameters}
+
+    except Exception:
+        return {"error": traceback.format_exc()}
+
+
+def pkoutputs_from_pk(timecourse: Dict, dosing, ctype: str, parameters: Dict) -> List[Dict]:
+    """Creates the outputs for the calculated pharmacokinetic parameters.
+
+    :param parameters: dict of (magnitude, unit) created by `calculate_pk`
+    :return:
+    """
+    def get_or_none(id, model):
+        if id:
+            return model.objects.get(id=id)
+
+    # shared by all pk parameters of the timecourse
+    tissue = info_node_registry.specific_by_pk("tissue", timecourse["tissue"] or None)
+    method = info_node_registry.specific_by_pk("method", timecourse["method"] or None)
+    substance = info_node_registry.specific_by_pk("substance", timecourse["substance"] or None)
+    group = get_or_none(id=timecourse["group"], model=Group)
+    individual = get_or_none(timecourse["individual"], model=Individual)
+
+    outputs = []
+    for key, (magnitude, unit) in parameters.items():
+        output_dict = {}
+        output_dict[ctype] = magnitude
+        output_dict["unit"] = unit
+        output_dict["measurement_type"] = info_node_registry.measurement_type(PK_MEASUREMENT_TYPES[key])
+        output_dict["calculated"] = True
+        output_dict["tissue"] = tissue
+        output_dict["method"] = method
+        output_dict["substance"] = substance
+        output_dict["group"] = group
+        output_dict["individual"] = individual
+        output_dict["interventions"] = timecourse["interventions"]
+        output_dict["study"] = dosing.study
+        if PK_MEASUREMENT_TYPES[key] == "auc_end":
+            output_dict["time"] = max(timecourse["time"])
+            output_dict["time_unit"] = str(timecourse["time_unit"])
+
+        outputs.append(output_dict)
 
     return outputs
 
@@ -96,16 +195,16 @@ def _timecourse_to_pkdict(tc: dict, dosing) -> Dict:
 
     """Create dictionary for pk calculation from timecourse.
 
+    Quantities are stored as (magnitude, unit) tuples (see `calculate_pk`).
+
     :return: dict
     """
     pk_dict = {}
-    Q_ = ureg.Quantity
-    pk_dict['ureg'] = ureg  # for unit conversions
 
     # substance
     pk_dict["substance"] = tc["substance_name"]
     # time
-    pk_dict["time"] = Q_(np.array(tc["time"]), tc["time_unit"])
+    pk_dict["time"] = (np.array(tc["time"]), tc["time_unit"])
 
     # concentratio
     values = None
@@ -119,23 +218,23 @@ def _timecourse_to_pkdict(tc: dict, dosing) -> Dict:
     elif tc["value"]:
         values = np.array(tc["value"])
         ctype = "value"
+    pk_dict['ctype'] = ctype
     if ctype is not None:
-        pk_dict["concentration"] = Q_(values, tc["unit"])
-        pk_dict['ctype'] = ctype
+        pk_dict["concentration"] = (values, tc["unit"])
 
     # dosing
-    pk_dict["dose"] = Q_(np.nan, "mg")
+    pk_dict["dose"] = (np.nan, "mg")
 
     if dosing:
         if dosing.substance.pk == tc["substance"]:
             # pharmacokinetics is only calculated for single dose experiments
             # where the applied substance is the measured substance!
 
-            if MeasurementType.objects.get(info_node__name="restricted dosing")._is_valid_unit(dosing.unit):
+            if info_node_registry.measurement_type("restricted dosing")._is_valid_unit(dosing.unit):
                 if dosing.value is not None:
-                    pk_dict["dose"] = Q_(dosing.value, dosing.unit)
+                    pk_dict["dose"] = (dosing.value, dosing.unit)
                 else:
                     warnings.warn(f"restricted dosing requires value: {dosing}")
                 if dosing.time is not None:
-                    pk_dict["intervention_time"] = Q_(dosing.time, dosing.time_unit)
+                    pk_dict["intervention_time"] = (dosing.time, dosing.time_unit)
     return pk_dict
@@ -9,6 +9,7 @@ from rest_framework import serializers
 from pkdb_app import utils
 from pkdb_app.behaviours import MEASUREMENTTYPE_FIELDS, EX_MEASUREMENTTYPE_FIELDS, VALUE_FIELDS, map_field
 from pkdb_app.info_nodes.models import InfoNode
+from pkdb_app.info_nodes.registry import InfoNodeSlugRelatedField
 from pkdb_app.info_nodes.serializers import MeasurementTypeableSerializer
 from pkdb_app.interventions.serializers import InterventionSmallElasticSerializer
 from .models import (
@@ -69,17 +70,15 @@ class OutputSerializer(MeasurementTypeableSerializer):
         required=False,
         allow_null=True,
     )
-    tissue = utils.SlugRelatedField(
-        slug_field="name",
-        queryset=InfoNode.objects.filter(ntype=InfoNode.NTypes.Tissue),
+    tissue = InfoNodeSlugRelatedField(
+        ntype=InfoNode.NTypes.Tissue,
         read_only=False,
         required=False,
         allow_null=True,
     )
 
-    method = utils.SlugRelatedField(
-        slug_field="name",
-        queryset=InfoNode.objects.filter(ntype=InfoNode.NTypes.Method),
+    method = InfoNodeSlugRelatedField(
+        ntype=InfoNode.NTypes.Method,
         read_only=False,
         required=False
     )
@@ -1,12 +1,11 @@
 import copy
-import numbers
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.db.models import Q
 from rest_framework import serializers
 from rest_framework.settings import api_settings
 
@@ -16,7 +15,7 @@ from pkdb_app.interventions.models import DataFile, Intervention
 from pkdb_app.error_measures import calculate_se, calculate_sd, calculate_cv
 from pkdb_app.studies.models import Study
 from pkdb_app.subjects.models import Group, Individual
-from pkdb_app.utils import recursive_iter, set_keys
+from pkdb_app.utils import recursive_iter
 
 ITEM_SEPARATOR = "||"
 ITEM_MAPPER = "=="
@@ -88,6 +87,159 @@ class WrongKeyValidationSerializer(serializers.ModelSerializer):
         return rep
 
 
+class SourceFrame(object):
+    """ Parsed source file.
+
+    Holds an index of the row labels per cell value for the columns used in
+    subsets ('col==value'), so that repeated subsets do not scan the column.
+    """
+
+    def __init__(self, df, data_file):
+        self.df = df
+        self.data_file = data_file
+        self._indices = {}
+
+    def labels(self, column, value):
+        """ Labels of the rows with the value in the column.
+
+        Only text columns are indexed, None is returned for other columns.
+        """
+        if column not in self._indices:
+            series = self.df[column]
+            if series.dtype == object:
+                self._indices[column] = series.groupby(series, sort=False).indices
+            else:
+                self._indices[column] = None
+
+        indices = self._indices[column]
+        if indices is None:
+            return None
+        return self.df.index[indices.get(value, [])]
+
+
+class SourceColumns(object):
+    """ Values of the columns of a source file as used in entries.
+
+    The columns are addressed like the fields of 'DataFrame.itertuples' (i.e. 'Index'
+    is the row label and invalid field names are not accessible). NaN values are None,
+    strings are stripped and values of list fields are split.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.fields = list(namedtuple("Pandas", ["Index"] + list(df.columns), rename=True)._fields)
+        self._values = {}
+
+    def has(self, column):
+        return column in self.fields
+
+    def values(self, column, split_list=False):
+        """ Values of the column for all rows. """
+        if column not in self._values:
+            self._values[column] = self._column_values(self.fields.index(column))
+        if split_list:
+            return self._split_lists(self._values[column])
+        return self._values[column]
+
+    def _column_values(self, position):
+        if position == 0:
+            series = self.df.index.to_series()
+        else:
+            series = self.df.iloc[:, position - 1]
+
+        values = series.to_numpy(dtype=object)
+        if series.dtype == object:
+            try:
+                stripped = series.str.strip()
+            except AttributeError:
+                # no strings in column
+                pass
+            else:
+                values = np.where(stripped.notna().to_numpy(), stripped.to_numpy(dtype=object), values)
+        values[pd.isna(values)] = None
+        return values.tolist()
+
+    @staticmethod
+    def _split_lists(values):
+        """ 'MappingSerializer.string_to_list' for all values. """
+        series = pd.Series(values, dtype=object)
+        split = series.astype(bool).to_numpy()
+        split_values = series[split].astype(str).str.strip().str.split(r"\s*,\s*").tolist()
+
+        values = list(values)
+        for index, value in zip(np.flatnonzero(split).tolist(), split_values):
+            values[index] = value
+        return values
+
+
+class TemplateMapping(object):
+    """ Template of entries compiled for a source file.
+
+    Fields of the template are mapped to columns via 'col==<column>'. The template is
+    compiled once and the mapped values are taken column-wise from the source file. The
+    entries are identical to a deepcopy of the template with the mapped fields set to the
+    values of the row.
+    """
+    LIST_FIELDS = ["interventions", "dimensions", "shared"]
+
+    def __init__(self, template, data, columns, source_file):
+        """
+        :param template: template of the entries
+        :param data: details of validation errors
+        :param columns: SourceColumns
+        :param source_file: file name for validation errors
+        """
+        self.columns = columns
+        self.error = None
+        self.mappings = {}
+
+        for keys, value in recursive_iter(template):
+            if isinstance(value, str):
+                if ITEM_MAPPER in value:
+                    values = value.split(ITEM_MAPPER)
+                    values = [v.strip() for v in values]
+                    if len(values) != 2 or values[0] != "col":
+                        self._add_error(["field has wrong pattern col=='col_value'", data])
+                    elif not columns.has(values[1]):
+                        self._add_error([
+                            f"header key <{values[1]}> does not exist in <{source_file}>.",
+                            data
+                        ])
+                    elif keys[0] in self.LIST_FIELDS:
+                        # list fields are replaced as a whole
+                        self.mappings[keys[:1]] = (values[1], True)
+                    else:
+                        self.mappings[keys] = (values[1], False)
+
+        self._build = self._compile(template, ())
+
+    def _add_error(self, error):
+        # errors are raised for the first mapped row, the first error of the template is reported
+        if self.error is None:
+            self.error = error
+
+    def _compile(self, node, keys):
+        if keys in self.mappings:
+            return self.columns.values(*self.mappings[keys]).__getitem__
+
+        if isinstance(node, dict):
+            items = [(key, self._compile(value, keys + (key,))) for key, value in node.items()]
+            return lambda row: {key: build(row) for key, build in items}
+
+        if isinstance(node, (list, tuple)):
+            container = type(node)
+            builds = [self._compile(value, keys + (idx,)) for idx, value in enumerate(node)]
+            return lambda row: container(build(row) for build in builds)
+
+        return lambda row: node
+
+    def entries(self, rows):
+        """ Entries for the rows (positions in the source file). """
+        if self.error is not None and len(rows) > 0:
+            raise serializers.ValidationError(self.error)
+        return [self._build(row) for row in rows]
+
+
 class MappingSerializer(WrongKeyValidationSerializer):
     # ----------------------------------
     # helper
@@ -249,7 +401,7 @@ class MappingSerializer(WrongKeyValidationSerializer):
     # ----------------------------------
     # helper for export of entries from file
     # ----------------------------------
-    def subset_pd(self, subset, df):
+    def subset_pd(self, subset, df, source_frame=None):
         values = subset.split(ITEM_MAPPER)
         values = [v.strip() for v in values]
         if len(values) != 2:
@@ -263,10 +415,17 @@ class MappingSerializer(WrongKeyValidationSerializer):
             raise serializers.ValidationError(
                 {"subset": f"your source file has no column <{values[0]}>"}
             )
-        try:
-            df = df.loc[df[values[0]] == values[1]]
-        except TypeError:
-            df = df.loc[df[values[0]] == float(values[1])]
+        labels = source_frame.labels(values[0], values[1]) if source_frame is not None else None
+        if labels is not None:
+            if df is source_frame.df:
+                df = df.loc[labels]
+            else:
+                df = df.loc[df.index.intersection(labels)]
+        else:
+            try:
+                df = df.loc[df[values[0]] == values[1]]
+            except TypeError:
+                df = df.loc[df[values[0]] == float(values[1])]
 
         if len(df) == 0:
             raise serializers.ValidationError(
@@ -301,6 +460,26 @@ class MappingSerializer(WrongKeyValidationSerializer):
                     "source": f"<{str(source)}> does not exist",
                     "detail": type(source)
                 })
+        source_frame = self.source_frame(source, subset)
+        df = source_frame.df
+
+        # filter subset
+        if subset:
+            if "&" in subset:
+                for subset_single in [s.strip() for s in subset.split("&")]:
+                    df = self.subset_pd(subset_single, df, source_frame)
+            else:
+                df = self.subset_pd(subset, df, source_frame)
+
+        return df
+
+    def source_frame(self, source, subset):
+        """ Parsed source file. Source files are parsed once per upload. """
+        source_frames = self.context.setdefault("source_frames", {})
+        source_frame = source_frames.get(int(source))
+        if source_frame is not None:
+            return source_frame
+
         src = DataFile.objects.get(pk=source)
 
         if Path(src.file.name).suffix != ".tsv":
@@ -317,6 +496,7 @@ class MappingSerializer(WrongKeyValidationSerializer):
                 delimiter="\t",
                 keep_default_na=False,
                 na_values=NA_VALUES,
+                engine=settings.SOURCE_FILE_CSV_ENGINE,
             )
             df.columns = df.columns.str.strip()
 
@@ -328,68 +508,30 @@ class MappingSerializer(WrongKeyValidationSerializer):
                 }
             )
 
-        # filter subset
-        if subset:
-            if "&" in subset:
-                for subset_single in [s.strip() for s in subset.split("&")]:
-                    df = self.subset_pd(subset_single, df)
-            else:
-                df = self.subset_pd(subset, df)
-
-        return df
-
-    def make_entry(self, entry, template, data, source):
-        entry_dict = copy.deepcopy(template)
-        recursive_entry_dict = list(recursive_iter(entry_dict))
-
-        for keys, value in recursive_entry_dict:
-            if isinstance(value, str):
-                if ITEM_MAPPER in value:
-                    values = value.split(ITEM_MAPPER)
-                    values = [v.strip() for v in values]
-                    if len(values) != 2 or values[0] != "col":
-                        raise serializers.ValidationError(
-                            ["field has wrong pattern col=='col_value'", data]
-                        )
-                    try:
-                        entry_value = getattr(entry, values[1])
-
-
-
-                    except AttributeError:
-
-                        raise serializers.ValidationError(
-                            [
-                                f"header key <{values[1]}> does not exist in <{DataFile.objects.get(pk=source).file}>.",
-                                data
-                            ]
-                        )
-                    if isinstance(entry_value, numbers.Number):
-                        if np.isnan(entry_value):
-                            entry_value = None
+        source_frame = SourceFrame(df, src)
+        source_frames[int(source)] = source_frame
+        return source_frame
 
-                    if isinstance(entry_value, str):
-                        entry_value = entry_value.strip()
+    def _groupby_with_list(self, keys, template, df, data, source, groupby, entries, columns=None):
+        columns = columns or SourceColumns(df)
+        source_file = self.source_frame(source, None).data_file.file
 
-                    if keys[0] in ["interventions", "dimensions", "shared"]:
-                        entry_value = self.string_to_list(entry_value)
-                        set_keys(entry_dict, entry_value, *keys[:1])
-
-                    else:
-                        set_keys(entry_dict, entry_value, *keys)
-        return entry_dict
-
-    def _groupby_with_list(self, keys, template, df, data, source, groupby, entries):
         poped_keys = {key: template.pop(key) for key in keys if key in template}
-        for non_values_keys, group_df in df.groupby(groupby, sort=False):
-            entry_dict = self.make_entry(next(group_df.itertuples()), template, data, source)
+        entry_mapping = TemplateMapping(template, data, columns, source_file)
+        value_mappings = {
+            key: [TemplateMapping(value, values, columns, source_file) for value in values]
+            for key, values in poped_keys.items()
+        }
+        # rows are addressed by position
+        for non_values_keys, group_df in df.reset_index(drop=True).groupby(groupby, sort=False):
+            rows = group_df.index.tolist()
+            entry_dict = entry_mapping.entries(rows[:1])[0]
 
             new_values = []
-            for entry in group_df.itertuples():
-                for key, values in poped_keys.items():
-                    for value in values:
-                        value = self.make_entry(entry, value, values, source)
-                        new_values.append(value)
+            for row in rows:
+                for key, mappings in value_mappings.items():
+                    for mapping in mappings:
+                        new_values.append(mapping.entries([row])[0])
 
                     entry_dict[key] = new_values
             entries.append(entry_dict)
@@ -406,6 +548,7 @@ class MappingSerializer(WrongKeyValidationSerializer):
         if source:
             df = self.df_from_file(source, subset)
             template = copy.deepcopy(template)
+            columns = SourceColumns(df)
 
             mappings = []
             for key, value in template.items():
@@ -418,7 +561,8 @@ class MappingSerializer(WrongKeyValidationSerializer):
             if template.get("name", "").startswith("col=="):
                 groupby = [template.get("name")[5:]]
                 try:
-                  self._groupby_with_list(["characteristica", "subsets"], template, df, data, source, groupby, entries)
+                  self._groupby_with_list(["characteristica", "subsets"], template, df, data, source, groupby, entries,
+                                          columns)
                 except KeyError:
                     raise serializers.ValidationError(
                         [
@@ -428,9 +572,8 @@ class MappingSerializer(WrongKeyValidationSerializer):
                         ]
                     )
             else:
-                for entry in df.itertuples():
-                    entry_dict = self.make_entry(entry, template, data, source)
-                    entries.append(entry_dict)
+                source_file = self.source_frame(source, subset).data_file.file
+                entries.extend(TemplateMapping(template, data, columns, source_file).entries(range(len(df))))
 
             if len(mappings) == 0 and len(entries) == 0:
                 raise serializers.ValidationError(
@@ -472,44 +615,69 @@ class MappingSerializer(WrongKeyValidationSerializer):
         return rep
 
 
+class RelatedNameResolver(object):
+    """ Resolves names of groups, individuals and interventions of a study to pks.
+
+    The groups, individuals and normed interventions of the study are loaded once,
+    names are resolved in memory. The resolver is stored in the serializer context,
+    i.e. it is scoped to a single upload.
+    """
+
+    def __init__(self, study_sid):
+        self.study_sid = study_sid
+        self.groups = self._pks_by_name(Group.objects.filter(study__sid=study_sid))
+        self.individuals = self._pks_by_name(Individual.objects.filter(study__sid=study_sid))
+        self.interventions = self._pks_by_name(Intervention.objects.filter(study__sid=study_sid, normed=True))
+
+    @staticmethod
+    def _pks_by_name(queryset):
+        pks = {}
+        for pk, name in queryset.values_list("pk", "name"):
+            pks.setdefault(name, []).append(pk)
+        return pks
+
+
 class ExSerializer(MappingSerializer):
 
 
+    def related_resolver(self):
+        """ Resolver of related names of the study, shared by all serializers of the upload. """
+        resolver = self.context.get("related_resolver")
+        if resolver is None:
+            study_sid = self.context["request"].path.split("/")[-2]
+            resolver = RelatedNameResolver(study_sid)
+            self.context["related_resolver"] = resolver
+        return resolver
+
     def to_internal_related_fields(self, data):
-        study_sid = self.context["request"].path.split("/")[-2]
+        resolver = self.related_resolver()
         if "group" in data:
             if data["group"]:
-                try:
-                    data["group"] = Group.objects.get(
-                        Q(study__sid=study_sid)
-                        & Q(name=data.get("group"))
-                    ).pk
-                except ObjectDoesNotExist:
+                pks = resolver.groups.get(str(data["group"]), [])
+                if not pks:
                     raise serializers.ValidationError(
                         f'group <{data.get("group")}> does not exist, check groups.'
                     )
-                except MultipleObjectsReturned:
+                if len(pks) > 1:
                     raise serializers.ValidationError(
                         f'group <{data.get("group")}> is defined multiple times.'
                     )
+                data["group"] = pks[0]
 
         if "individual" in data:
             if data["individual"]:
-                try:
-                    data["individual"] = Individual.objects.get(
-                        Q(study__sid=study_sid) & Q(name=data.get("individual"))
-                    ).pk
-
-                except ObjectDoesNotExist:
+                pks = resolver.individuals.get(str(data["individual"]), [])
+                if not pks:
                     raise serializers.ValidationError(
                         f'individual: individual <{data.get("individual")}> does '
                         f'not exist, check individuals.'
                     )
-                except MultipleObjectsReturned:
+                if len(pks) > 1:
                     raise serializers.ValidationError(
                         f'individual: individual <{data.get("individual")}> is '
                         f'defined multiple times'
                     )
+                data["individual"] = pks[0]
 
         if "interventions" in data:
             if data["interventions"]:
@@ -518,21 +686,19 @@ class ExSerializer(MappingSerializer):
                     data["interventions"] = self.string_to_list(data["interventions"])
 
                 for intervention in data["interventions"]:
-                    try:
-                        interventions.append(
-                            Intervention.objects.get(
-                                Q(study__sid=study_sid)
-                                & Q(name=intervention, normed=True)
-                            ).pk
-                        )
-                    except ObjectDoesNotExist:
+                    pks = resolver.interventions.get(str(intervention), [])
+                    if not pks:
                         raise serializers.ValidationError(
                             f"intervention <{intervention}> does not exist, check interventions."
                         )
+                    if len(pks) > 1:
+                        raise Intervention.MultipleObjectsReturned(
+                            f"get() returned more than one Intervention -- it returned {len(pks)}!"
+                        )
+                    interventions.append(pks[0])
                 data["interventions"] = interventions
         return data
 
-
     def _validate_disabled_data(self, data_dict, disabled):
         disabled = set(disabled)
         wrong_keys = disabled.intersection(set(data_dict.keys()))
@@ -238,6 +238,21 @@ ELASTICSEARCH_DSL = {
     },
 }
 
+# maximal number of elastic queries run concurrently by the filter endpoint
+ELASTIC_QUERY_WORKERS = int(os.getenv("PKDB_ELASTIC_QUERY_WORKERS", 5))
+# bulk indexing of studies
+ELASTIC_BULK_CHUNK_SIZE = int(os.getenv("PKDB_ELASTIC_BULK_CHUNK_SIZE", 500))
+ELASTIC_BULK_THREADS = int(os.getenv("PKDB_ELASTIC_BULK_THREADS", 4))
+
+# seconds between checks of the shared info node version (see info_nodes.version)
+INFO_NODES_VERSION_INTERVAL = float(os.getenv("PKDB_INFO_NODES_VERSION_INTERVAL", 2))
+# maximal number of compiled unit conversions kept in memory
+UNIT_CONVERSIONS_CACHE_SIZE = int(os.getenv("PKDB_UNIT_CONVERSIONS_CACHE_SIZE", 4096))
+# processes for the pharmacokinetics calculation of timecourses during upload
+PK_CALCULATION_WORKERS = int(os.getenv("PKDB_PK_CALCULATION_WORKERS", os.cpu_count() or 1))
+# pandas engine for reading source files ("c" or "pyarrow", which requires pandas>=1.4 and pyarrow)
+SOURCE_FILE_CSV_ENGINE = os.getenv("PKDB_SOURCE_FILE_CSV_ENGINE", "c")
+
 DJANGO_CONFIGURATION = os.environ['PKDB_DJANGO_CONFIGURATION']
 # ------------------------------
 # local
@@ -1,18 +1,17 @@
 """
 Basic information and statistics about data base content.
 """
-from django.db.models import Count, F, Q
-from pkdb_app.data.models import SubSet, Data
-from pkdb_app.info_nodes.models import  Substance
+from threading import Lock
+
+from pkdb_app.info_nodes.models import Substance
+from pkdb_app.info_nodes.version import info_nodes_version
 from rest_framework import serializers
 from rest_framework import viewsets
 from rest_framework.response import Response
 
 from pkdb_app._version import __version__
-from pkdb_app.interventions.models import Intervention
-from pkdb_app.outputs.models import Output
-from pkdb_app.studies.models import Study, Reference
-from pkdb_app.subjects.models import Group, Individual
+from pkdb_app.studies.managers import STATISTICS_COUNTS
+from pkdb_app.studies.models import StatisticsTotal
 
 
 '''
@@ -46,19 +45,7 @@ Substance statistics: /statistics/substances/
 '''
 class SubstanceStatisticsViewSet(viewsets.ViewSet):
     def list(self,request):
-        substances_interventions = Substance.objects.annotate(label=F('info_node__label'),intervention_count=Count("intervention", filter=Q(intervention__normed=True))).order_by('info_node__label')
-        substances_outputs = Substance.objects.annotate(label=F('info_node__label'),output_count=Count("output", filter=Q(output__normed=True))).order_by('info_node__label')
-
-        data = zip(substances_outputs.values("info_node__label"),substances_outputs.values("output_count"), substances_interventions.values("intervention_count"))
-
-        result = []
-        for x in data:
-            res = {}
-            for v in x:
-                res = {**res, **v}
-            result.append(res)
-
-        return Response(result)
+        return Response(statistics_store.substances())
 
 
 class SubstanceStatisticsSerializer(serializers.Serializer):
@@ -67,20 +54,74 @@ class SubstanceStatisticsSerializer(serializers.Serializer):
     output_count = serializers.IntegerField(allow_null=True)
 
 
+class StatisticsStore(object):
+    """ Database statistics served from memory.
+
+    The statistics are maintained incrementally per study (see StudyStatisticsManager)
+    and rebuilt by the 'rebuild_statistics' command. The in-memory copy is reloaded
+    when the version of the StatisticsTotal changes.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._total = None
+        # (key, substances)
+        self._substances = (None, None)
+
+    def total(self) -> StatisticsTotal:
+        """ Statistics totals.
+
+        The totals are empty until the statistics are built by the 'rebuild_statistics' command
+        or the first study upload.
+        """
+        version = StatisticsTotal.objects.filter(pk=StatisticsTotal.PK).values_list("version", flat=True).first()
+        if version is None:
+            return StatisticsTotal(pk=StatisticsTotal.PK, version=None)
+
+        total = self._total
+        if total is None or total.version != version:
+            with self._lock:
+                if self._total is None or self._total.version != version:
+                    self._total = StatisticsTotal.objects.get(pk=StatisticsTotal.PK)
+                total = self._total
+        return total
+
+    def counts(self) -> dict:
+        return self.total().counts
+
+    def substances(self) -> list:
+        """ Counts of normed interventions and outputs for all substances ordered by label."""
+        total = self.total()
+        # substances change with the statistics or the info nodes
+        key = (total.version, info_nodes_version.current())
+        substances_key, substances = self._substances
+        if total.version is None or substances_key != key:
+            substances = []
+            rows = Substance.objects.filter(info_node__isnull=False).values_list("pk", "info_node__label")
+            for pk, label in rows:
+                counts = total.substances.get(str(pk), {})
+                substances.append({
+                    "info_node__label": label,
+                    "output_count": counts.get("output_count", 0),
+                    "intervention_count": counts.get("intervention_count", 0),
+                })
+            # labels in ascending order, missing labels last
+            substances.sort(key=lambda s: (s["info_node__label"] is None, s["info_node__label"] or ""))
+            self._substances = (key, substances)
+        return substances
+
+
+statistics_store = StatisticsStore()
+
+
 class Statistics(object):
     """ Basic database statistics. """
 
     def __init__(self):
         self.version = __version__
-        self.study_count = Study.objects.count()
-        self.reference_count = Reference.objects.count()
-        self.group_count = Group.objects.count()
-        self.individual_count = Individual.objects.count()
-        self.intervention_count = Intervention.objects.filter(normed=True).count()
-        self.output_count = Output.objects.filter(normed=True).count()
-        self.output_calculated_count = Output.objects.filter(normed=True, calculated=True).count()
-        self.timecourse_count = SubSet.objects.filter(data__data_type=Data.DataTypes.Timecourse).count()
-        self.scatter_count = SubSet.objects.filter(data__data_type=Data.DataTypes.Scatter).count()
+        counts = statistics_store.counts()
+        for key in STATISTICS_COUNTS:
+            setattr(self, key, counts.get(key, 0))
 
 
 class StatisticsViewSet(viewsets.ViewSet):
@@ -1,9 +1,13 @@
+import time
+
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
+from elasticsearch_dsl import Q, UpdateByQuery
 
 from pkdb_app.documents import autocomplete, autocomplete_search, elastic_settings, string_field, text_field, \
     ObjectField, study_field, info_node
 from pkdb_app.studies.models import Reference, Study
+from pkdb_app.studies.summaries import with_summaries
 
 comments_field = fields.ObjectField(
     properties={
@@ -86,6 +90,8 @@ class StudyDocument(Document):
     name = string_field("name")
     licence = string_field("licence")
     access = string_field("access")
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "sid__raw"
     date = fields.DateField()
 
     descriptions = descriptions_field
@@ -206,3 +212,39 @@ class StudyDocument(Document):
     class Index:
         name = 'studies'
         settings = elastic_settings
+
+    def get_queryset(self):
+        """Not mandatory but to improve performance we can select related in one sql request"""
+        return super(StudyDocument, self).get_queryset().select_related("reference", "creator")
+
+    def get_indexing_queryset(self):
+        # counts and substances are computed in batches (see studies.summaries)
+        return with_summaries(super(StudyDocument, self).get_indexing_queryset())
+
+
+def update_index_study_permissions(study):
+    """ Updates the access in all elastic documents of the study.
+
+    Members of a study are resolved via StudyRight (see PermissionContext), so only a change
+    of the access has to be written to the documents. The access is set via update by query
+    in every index with access and only in documents with a different access, so that the
+    documents of the study are not prepared and indexed again.
+
+    :return: dictionary of document names with the number of updated documents
+    """
+    documents = {}
+    for doc in registry.get_documents():
+        if "access" not in doc._doc_type.mapping:
+            continue
+        query = Q('term', **{doc.study_sid_field: study.sid}) & ~Q('term', access__raw=study.access)
+        update = UpdateByQuery(index=doc._index._name).query(query).script(
+            source="ctx._source.access = params.access", lang="painless", params={"access": study.access}
+        )
+        time_start = time.time()
+        response = update.params(conflicts="proceed", refresh=True).execute()
+        documents[doc.__name__] = {
+            "count": response.updated,
+            "errors": len(response.failures),
+            "time": time.time() - time_start,
+        }
+    return documents
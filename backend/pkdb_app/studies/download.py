@@ -0,0 +1,95 @@
+"""
+Streaming zip archive for the download of filter results.
+
+The archive is written incrementally into a small in-memory buffer which is
+drained after every write, so memory use stays bounded independent of the
+size of the results.
+"""
+import csv
+import zipfile
+from io import TextIOWrapper
+from typing import Iterable, Dict, List, Tuple
+
+
+class StreamBuffer:
+    """Unseekable file-like object collecting the bytes written by ZipFile."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def csv_rows(rows: Iterable[Dict], fieldnames: List[str]):
+    """ Yields csv lines for the given rows.
+
+    The header is written from the fieldnames, also if there are no rows. Missing keys
+    are written as empty values. A leading index column is written, corresponding to
+    the csv files created with pandas.
+    """
+    line = _LineBuffer()
+    writer = csv.DictWriter(line, fieldnames=[""] + list(fieldnames), extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    yield line.pop()
+    for index, row in enumerate(rows):
+        writer.writerow({"": index, **row})
+        yield line.pop()
+
+
+class _LineBuffer:
+    def __init__(self):
+        self._lines = []
+
+    def write(self, line):
+        self._lines.append(line)
+
+    def pop(self) -> str:
+        data = "".join(self._lines)
+        self._lines = []
+        return data
+
+
+def zip_stream(sheets: Dict[str, Tuple[List[str], Iterable[Dict]]], extra_files: Dict[str, str] = None,
+               chunk_size: int = 2 ** 16):
+    """ Generator of the bytes of a zip archive.
+
+    :param sheets: dictionary of csv names and the (fieldnames, rows) of the csv
+    :param extra_files: dictionary of archive names and paths of files added to the archive
+    :param chunk_size: minimal number of bytes per yielded chunk
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for key, (fieldnames, rows) in sheets.items():
+            with archive.open(f"{key}.csv", "w", force_zip64=True) as binary_file:
+                text_file = TextIOWrapper(binary_file, encoding="utf-8", newline="")
+                for line in csv_rows(rows, fieldnames):
+                    text_file.write(line)
+                    if buffer.size >= chunk_size:
+                        yield buffer.pop()
+                text_file.flush()
+                text_file.detach()
+            yield buffer.pop()
+
+        for arcname, path in (extra_files or {}).items():
+            archive.write(path, arcname)
+            yield buffer.pop()
+
+    yield buffer.pop()
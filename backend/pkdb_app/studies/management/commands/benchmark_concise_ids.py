@@ -0,0 +1,131 @@
+"""
+Benchmarks the collection of the concise filter ids on synthetic output facts.
+
+Compares the former loop over output dicts with PKData.concise_ids_from_rows.
+No database access is required.
+
+python manage.py benchmark_concise_ids
+python manage.py benchmark_concise_ids --outputs 100000
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from pkdb_app.outputs.models import Output
+from pkdb_app.studies.views import PKData
+
+OUTPUT_TYPES = [Output.OutputTypes.Output, Output.OutputTypes.Timecourse, Output.OutputTypes.Array]
+
+
+def synthetic_facts(n_outputs: int, seed: int = 42) -> np.ndarray:
+    """ Fact rows (see PKData.concise_ids) with nulls as -1 and output type codes."""
+    rng = np.random.default_rng(seed)
+    has_group = rng.random(n_outputs) < 0.7
+    has_intervention = rng.random(n_outputs) < 0.8
+    has_subset = rng.random(n_outputs) < 0.4
+
+    data = np.empty((n_outputs, 7), dtype=np.int64)
+    data[:, 0] = rng.integers(1, 501, n_outputs)
+    data[:, 1] = np.where(has_group, rng.integers(1, 20001, n_outputs), -1)
+    data[:, 2] = np.where(has_group, -1, rng.integers(1, 100001, n_outputs))
+    data[:, 3] = np.arange(1, n_outputs + 1)
+    data[:, 4] = np.where(has_intervention, rng.integers(1, 30001, n_outputs), -1)
+    data[:, 5] = np.where(has_subset, rng.integers(1, 50001, n_outputs), -1)
+    data[:, 6] = np.where(has_subset, rng.integers(1, 3, n_outputs), 0)
+    return data
+
+
+def output_dicts(data: np.ndarray) -> list:
+    """ Rows of the former 'Output.objects.values(...)' query."""
+    def none(value):
+        return None if value < 0 else value
+
+    return [
+        {
+            "study_id": study,
+            "group_id": none(group),
+            "individual_id": none(individual),
+            "id": output,
+            "interventions__id": none(intervention),
+            "subset__id": none(subset),
+            "output_type": OUTPUT_TYPES[output_type],
+        }
+        for study, group, individual, output, intervention, subset, output_type in data.tolist()
+    ]
+
+
+def concise_ids_loop(outputs) -> dict:
+    """ Former collection of the concise ids with python sets."""
+    studies = set()
+    groups = set()
+    individuals = set()
+    interventions = set()
+    outputs_ = set()
+    timecourses = set()
+    scatters = set()
+
+    for output in outputs:
+        studies.add(output["study_id"])
+        if output["group_id"]:
+            groups.add(output["group_id"])
+        else:
+            individuals.add(output["individual_id"])
+        outputs_.add(output["id"])
+
+        if output["interventions__id"]:
+            interventions.add(output["interventions__id"])
+
+        if (output["subset__id"] is not None) & (output["output_type"] == Output.OutputTypes.Timecourse):
+            timecourses.add(output["subset__id"])
+
+        if (output["subset__id"] is not None) & (output["output_type"] == Output.OutputTypes.Array):
+            scatters.add(output["subset__id"])
+
+    return {
+        "studies": list(studies),
+        "groups": list(groups),
+        "individuals": list(individuals),
+        "interventions": list(interventions),
+        "outputs": list(outputs_),
+        "timecourses": list(timecourses),
+        "scatters": list(scatters),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the concise filter ids (python sets vs numpy) on synthetic output facts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outputs', default=500000, type=int, help="Number of synthetic outputs")
+        parser.add_argument('--repeat', default=3, type=int, help="Number of runs, the best run is reported")
+        parser.add_argument('--seed', default=42, type=int, help="Seed of the synthetic facts")
+
+    def best_time(self, func, repeat):
+        times = []
+        for _ in range(repeat):
+            time_start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - time_start)
+        return min(times), result
+
+    def handle(self, *args, **options):
+        data = synthetic_facts(options['outputs'], seed=options['seed'])
+        outputs = output_dicts(data)
+        rows = [tuple(row) for row in data.tolist()]
+
+        time_loop, ids_loop = self.best_time(lambda: concise_ids_loop(outputs), options['repeat'])
+        time_numpy, ids_numpy = self.best_time(lambda: PKData.concise_ids_from_rows(rows), options['repeat'])
+
+        identical = all(
+            {pk for pk in ids_loop[key] if pk is not None} == set(ids_numpy[key].tolist())
+            for key in ids_loop
+        )
+        self.stdout.write(f"outputs: {len(rows)}")
+        self.stdout.write(f"loop:  {time_loop:.3f} s")
+        self.stdout.write(f"numpy: {time_numpy:.3f} s")
+        self.stdout.write(f"speedup: {time_loop / time_numpy:.1f}x")
+        if not identical:
+            self.stderr.write(self.style.ERROR("Ids differ."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Ids identical."))
@@ -0,0 +1,34 @@
+"""
+Removes expired filter results (IdCollection and FilterCache) in batches.
+
+Runs periodically in the 'purge' service of the docker compose setup:
+python manage.py purge_id_collections
+python manage.py purge_id_collections --batch-size 500
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pkdb_app.studies.models import IdCollection, FilterCache
+
+
+class Command(BaseCommand):
+    help = 'Delete expired filter results in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=1000, type=int, help="Number of rows deleted per batch")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+
+        FilterCache.objects.filter(expire__lte=now).delete()
+
+        deleted = 0
+        while True:
+            pks = list(IdCollection.objects.filter(expire__lte=now).values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            IdCollection.objects.filter(pk__in=pks).delete()
+            deleted += len(pks)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired id collections."))
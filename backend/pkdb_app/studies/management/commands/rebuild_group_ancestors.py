@@ -0,0 +1,17 @@
+"""
+Rebuilds the closure table of the group hierarchies from the parents of the groups.
+
+python manage.py rebuild_group_ancestors
+"""
+from django.core.management.base import BaseCommand
+
+from pkdb_app.subjects.models import GroupAncestor
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the closure table of the group hierarchies (GroupAncestor)'
+
+    def handle(self, *args, **options):
+        count = GroupAncestor.objects.rebuild()
+        self.stdout.write(f"{count} groups")
+        self.stdout.write(self.style.SUCCESS("Group ancestors rebuilt."))
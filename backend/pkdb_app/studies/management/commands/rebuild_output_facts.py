@@ -0,0 +1,28 @@
+"""
+Rebuilds the output fact table used by the concise filter queries.
+
+python manage.py rebuild_output_facts
+python manage.py rebuild_output_facts --sid PKDB00001
+"""
+from django.core.management.base import BaseCommand
+
+from pkdb_app.outputs.models import OutputFact
+from pkdb_app.studies.models import Study
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the output facts of all studies (or of a single study)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sid', default=None, type=str, help="Study sid like 'PKDB00001' (optional)")
+
+    def handle(self, *args, **options):
+        studies = Study.objects.all()
+        if options.get('sid'):
+            studies = studies.filter(sid=options['sid'])
+
+        for study in studies.iterator():
+            count = OutputFact.objects.refresh_study(study)
+            self.stdout.write(f"{study.sid}: {count} facts")
+
+        self.stdout.write(self.style.SUCCESS("Output facts rebuilt."))
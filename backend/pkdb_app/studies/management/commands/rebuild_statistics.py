@@ -0,0 +1,21 @@
+"""
+Rebuilds the database statistics served by the statistics endpoints.
+
+python manage.py rebuild_statistics
+"""
+from django.core.management.base import BaseCommand
+
+from pkdb_app.studies.models import StudyStatistics, StatisticsTotal
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the statistics of all studies and the statistics totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=500, type=int, help="Number of studies per batch")
+
+    def handle(self, *args, **options):
+        count = StudyStatistics.objects.rebuild(batch_size=options['batch_size'])
+        total = StatisticsTotal.objects.get(pk=StatisticsTotal.PK)
+        self.stdout.write(f"{count} studies, version {total.version}")
+        self.stdout.write(self.style.SUCCESS("Statistics rebuilt."))
@@ -0,0 +1,20 @@
+"""
+Rebuilds the access control list of the studies (StudyRight).
+
+python manage.py rebuild_study_rights
+"""
+from django.core.management.base import BaseCommand
+
+from pkdb_app.studies.models import StudyRight
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the rights of all studies from creators, curators, collaborators and access'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=500, type=int, help="Number of studies per batch")
+
+    def handle(self, *args, **options):
+        count = StudyRight.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f"{count} studies")
+        self.stdout.write(self.style.SUCCESS("Study rights rebuilt."))
@@ -0,0 +1,199 @@
+"""
+the managers can be used to overwrite class methods of the models module.
+"""
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Count, Q
+
+# counts of the database statistics (see pkdb_app.statistics)
+STATISTICS_COUNTS = [
+    "study_count",
+    "reference_count",
+    "group_count",
+    "individual_count",
+    "intervention_count",
+    "output_count",
+    "output_calculated_count",
+    "timecourse_count",
+    "scatter_count",
+]
+
+
+class StudyStatisticsManager(models.Manager):
+    """ Maintains the database statistics incrementally per study.
+
+    The contribution of every study (counts and counts per substance) is stored in
+    StudyStatistics, the sums over all studies in the single StatisticsTotal row.
+    Updating or removing a study applies the difference to the totals and increments
+    the version of the totals.
+    """
+
+    def compute(self, study_ids):
+        """ Statistics of the studies with grouped count queries.
+
+        :return: dict of study pk -> {"counts": {...}, "substances": {substance pk: {...}}}
+        """
+        from pkdb_app.interventions.models import Intervention
+        from pkdb_app.outputs.models import Output
+        from .models import Study
+        from .summaries import study_counts
+
+        study_ids = list(study_ids)
+        counts = study_counts(study_ids)
+        statistics = {}
+        for study_id, reference_id in Study.objects.filter(pk__in=study_ids).values_list("pk", "reference_id"):
+            study_statistics = {key: counts[study_id].get(key, 0) for key in STATISTICS_COUNTS}
+            study_statistics["study_count"] = 1
+            study_statistics["reference_count"] = 1 if reference_id else 0
+            statistics[study_id] = {"counts": study_statistics, "substances": defaultdict(dict)}
+
+        def add_substance_counts(key, queryset):
+            rows = queryset.filter(study_id__in=study_ids, substance__isnull=False).values(
+                "study_id", "substance_id").annotate(n=Count("id"))
+            for row in rows:
+                statistics[row["study_id"]]["substances"][str(row["substance_id"])][key] = row["n"]
+
+        add_substance_counts("intervention_count", Intervention.objects.filter(normed=True))
+        add_substance_counts("output_count", Output.objects.filter(normed=True))
+
+        for study_statistics in statistics.values():
+            study_statistics["substances"] = dict(study_statistics["substances"])
+        return statistics
+
+    @staticmethod
+    def _apply(total, counts, substances, sign):
+        for key, value in counts.items():
+            total.counts[key] = total.counts.get(key, 0) + sign * value
+        for substance, substance_counts in substances.items():
+            total_counts = total.substances.setdefault(substance, {})
+            for key, value in substance_counts.items():
+                total_counts[key] = total_counts.get(key, 0) + sign * value
+            if not any(total_counts.values()):
+                del total.substances[substance]
+
+    def _locked_total(self):
+        from .models import StatisticsTotal
+
+        total = StatisticsTotal.objects.select_for_update().filter(pk=StatisticsTotal.PK).first()
+        if total is None:
+            # statistics were never built
+            self.rebuild()
+            total = StatisticsTotal.objects.select_for_update().get(pk=StatisticsTotal.PK)
+        return total
+
+    @transaction.atomic
+    def update_study(self, study):
+        """ Updates the statistics with the current content of the study."""
+        total = self._locked_total()
+        study_statistics = self.compute([study.pk])[study.pk]
+
+        old = self.filter(study=study).first()
+        if old is not None:
+            self._apply(total, old.counts, old.substances, -1)
+        self._apply(total, study_statistics["counts"], study_statistics["substances"], 1)
+        self.update_or_create(study=study, defaults=study_statistics)
+
+        total.version += 1
+        total.save()
+
+    @transaction.atomic
+    def remove_study(self, study):
+        """ Removes the contribution of the study from the statistics."""
+        total = self._locked_total()
+        old = self.filter(study=study).first()
+        if old is None:
+            return
+        self._apply(total, old.counts, old.substances, -1)
+        old.delete()
+
+        total.version += 1
+        total.save()
+
+    @transaction.atomic
+    def rebuild(self, batch_size=500):
+        """ Rebuilds the statistics of all studies and the totals."""
+        from .models import Study, StatisticsTotal
+
+        self.all().delete()
+        total, _ = StatisticsTotal.objects.select_for_update().get_or_create(pk=StatisticsTotal.PK)
+        total.counts = {key: 0 for key in STATISTICS_COUNTS}
+        total.substances = {}
+
+        study_ids = list(Study.objects.values_list("pk", flat=True))
+        for i in range(0, len(study_ids), batch_size):
+            statistics = self.compute(study_ids[i:i + batch_size])
+            self.bulk_create([self.model(study_id=study_id, **study_statistics)
+                              for study_id, study_statistics in statistics.items()])
+            for study_statistics in statistics.values():
+                self._apply(total, study_statistics["counts"], study_statistics["substances"], 1)
+
+        total.version += 1
+        total.save()
+        return len(study_ids)
+
+
+class StudyRightManager(models.Manager):
+    """ Maintains the access control list of the studies (see StudyRight)."""
+
+    def compute(self, study_ids):
+        """ Rights of the studies from creator, curators, collaborators and access.
+
+        :return: list of StudyRight (unsaved)
+        """
+        from pkdb_app.users.models import PUBLIC
+        from .models import Study, Rating
+
+        read, write = self.model.Rights.Read, self.model.Rights.Write
+        study_ids = list(study_ids)
+        rights = set()
+        for study_id, creator_id, access in Study.objects.filter(pk__in=study_ids).values_list(
+                "pk", "creator_id", "access"):
+            rights.update([(study_id, creator_id, read), (study_id, creator_id, write)])
+            if access == PUBLIC:
+                rights.add((study_id, None, read))
+
+        for study_id, user_id in Rating.objects.filter(study_id__in=study_ids).values_list("study_id", "user_id"):
+            rights.update([(study_id, user_id, read), (study_id, user_id, write)])
+
+        collaborators = Study.collaborators.through.objects.filter(study_id__in=study_ids)
+        for study_id, user_id in collaborators.values_list("study_id", "user_id"):
+            rights.add((study_id, user_id, read))
+
+        return [self.model(study_id=study_id, user_id=user_id, right=right) for study_id, user_id, right in rights]
+
+    @transaction.atomic
+    def update_study(self, study):
+        """ Replaces the rights of the study.
+
+        :return: True if the rights changed
+        """
+        rights = self.compute([study.pk])
+        current = set(self.filter(study=study).values_list("study_id", "user_id", "right"))
+        if current == {(right.study_id, right.user_id, right.right) for right in rights}:
+            return False
+
+        self.filter(study=study).delete()
+        self.bulk_create(rights)
+        return True
+
+    @transaction.atomic
+    def rebuild(self, batch_size=500):
+        """ Rebuilds the rights of all studies."""
+        from .models import Study
+
+        self.all().delete()
+        study_ids = list(Study.objects.values_list("pk", flat=True))
+        for i in range(0, len(study_ids), batch_size):
+            self.bulk_create(self.compute(study_ids[i:i + batch_size]))
+        return len(study_ids)
+
+    def readable(self, user):
+        """ Ids of the studies which can be read by the user (public studies and studies of the user).
+
+        Used as subquery, e.g. 'Study.objects.filter(pk__in=StudyRight.objects.readable(user))'.
+        """
+        users = Q(user__isnull=True)
+        if user.is_authenticated:
+            users |= Q(user=user)
+        return self.filter(users, right=self.model.Rights.Read).values("study_id")
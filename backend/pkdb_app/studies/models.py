@@ -4,13 +4,17 @@ Django model for Study.
 import datetime
 from django.utils.timezone import make_aware
 
-from django.contrib.postgres.fields import ArrayField
 from django.db import models
-from pkdb_app.data.models import DataSet, Data
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from pkdb_app.data.models import DataSet
 
-from pkdb_app.info_nodes.models import Substance, InfoNode
+from pkdb_app.id_sets import to_bytes, from_bytes, to_list
 from pkdb_app.users.models import PUBLIC, PRIVATE
 from ..behaviours import Sidable
+from .managers import StudyStatisticsManager, StudyRightManager
+from .summaries import study_summaries
 from ..interventions.models import InterventionSet, DataFile, Intervention
 from ..outputs.models import OutputSet, OutputIntervention
 from ..subjects.models import GroupSet, IndividualSet, Characteristica, Group, Individual
@@ -167,15 +171,17 @@ class Study(Sidable, models.Model):
         except AttributeError:
             return Group.objects.none()
 
+    @cached_property
+    def summary(self):
+        """ Counts, substances and characteristica of the study (see studies.summaries).
+
+        Set in batches via 'studies.summaries.with_summaries' when many studies are serialized.
+        """
+        return study_summaries([self.pk])[self.pk]
+
     @property
     def characteristica(self):
-        empty_characteristica = Characteristica.objects.none()
-        for group in self.groups.all():
-            empty_characteristica = empty_characteristica.union(group.characteristica.all())
-        for individual in self.individuals.all():
-            empty_characteristica = empty_characteristica.union(individual.characteristica.all())
-
-        return empty_characteristica
+        return Characteristica.objects.filter(pk__in=self.summary["characteristica"])
 
     @property
     def interventions(self):
@@ -198,32 +204,7 @@ class Study(Sidable, models.Model):
 
         Substances are collected from interventions, outputs, timecourses.
         """
-        all_substances = []
-        basic_substances = []
-
-        if self.interventions:
-            all_substances.extend(
-                list(self.interventions.filter(substance__isnull=False).values_list("substance__pk", flat=True))
-            )
-
-        if self.outputs:
-            all_substances.extend(
-                list(self.outputs.filter(substance__isnull=False).values_list("substance__pk", flat=True))
-            )
-
-        substances_dj = Substance.objects.filter(pk__in=set(all_substances))
-
-        basic_substances_dj = substances_dj.filter(info_node__parents__isnull=True)
-        if basic_substances_dj:
-            basic_substances.extend(list(basic_substances_dj.values_list("info_node__pk", flat=True)))
-
-        substances_derived_dj = substances_dj.filter(info_node__parents__isnull=False)
-        if substances_derived_dj:
-            basic_substances.extend(
-                list(substances_derived_dj.values_list("info_node__parents__pk", flat=True))
-            )
-
-        return InfoNode.objects.filter(pk__in=set(basic_substances))
+        return self.summary["substances"]
 
     @property
     def files_url(self):
@@ -243,41 +224,35 @@ class Study(Sidable, models.Model):
 
     @property
     def group_count(self):
-        if self.groupset:
-            return self.groupset.groups.count()
-        return 0
+        return self.summary["group_count"]
 
     @property
     def individual_count(self):
-        if self.individualset:
-            return self.individualset.individuals.count()
-        return 0
+        return self.summary["individual_count"]
 
     @property
     def intervention_count(self):
-        if self.interventionset:
-            return self.interventionset.interventions.filter(normed=True).count()
-        return 0
+        return self.summary["intervention_count"]
 
     @property
     def output_count(self):
-        return self.outputs.filter(normed=True).count()
+        return self.summary["output_count"]
 
     @property
     def output_calculated_count(self):
-        return self.outputs.filter(normed=True, calculated=True).count()
+        return self.summary["output_calculated_count"]
 
     @property
     def subset_count(self):
-        return self.subsets.count()
+        return self.summary["subset_count"]
 
     @property
     def timecourse_count(self):
-        return self.subsets.filter(data__data_type=Data.DataTypes.Timecourse).count()
+        return self.summary["timecourse_count"]
 
     @property
     def scatter_count(self):
-        return self.subsets.filter(data__data_type=Data.DataTypes.Scatter).count()
+        return self.summary["scatter_count"]
 
     def delete(self, *args, **kwargs):
         if self.outputset:
@@ -295,15 +270,43 @@ class Study(Sidable, models.Model):
         super().delete(*args, **kwargs)
 
 
+class StudyRight(models.Model):
+    """ Access control list of the studies.
+
+    One row per study, user and right. Creator and curators can read and write,
+    collaborators can read. Public studies have an additional read row without user.
+    The rows are replaced when creator, curators, collaborators or access of a study
+    change (see StudyRightManager.update_study).
+    """
+
+    class Rights(models.TextChoices):
+        """ Rights """
+        Read = 'read', _('read')
+        Write = 'write', _('write')
+
+    study = models.ForeignKey(Study, related_name="rights", on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name="study_rights", null=True, on_delete=models.CASCADE)
+    right = models.CharField(choices=Rights.choices, max_length=CHAR_MAX_LENGTH)
+
+    objects = StudyRightManager()
+
+    class Meta:
+        unique_together = ['study', 'user', 'right']
+        indexes = [
+            models.Index(fields=["user", "right", "study"]),
+        ]
+
+
 def expire():
     expire_datetime = datetime.datetime.now() + datetime.timedelta(days=1)
     return make_aware(expire_datetime)
 
 
-# FIXME: rename to something what it is (FilterQuery, IdCollection ?)
 class IdCollection(models.Model):
-    """
-    DOCUMENT ME
+    """ Resulting ids of a filter query for a single resource.
+
+    The ids are stored sorted, delta encoded and compressed (see pkdb_app.id_sets).
+    Expired collections are removed by the 'purge_id_collections' command.
     """
 
     class Recourses(models.TextChoices):
@@ -319,9 +322,66 @@ class IdCollection(models.Model):
 
     resource = models.CharField(choices=Recourses.choices, max_length=CHAR_MAX_LENGTH)
     uuid = models.UUIDField(null=False, blank=False, editable=False)
-    ids = ArrayField(models.IntegerField(), null=True, blank=True)
-    expire = models.DateTimeField(default=expire(), blank=True, editable=False)
+    data = models.BinaryField(editable=False)
+    expire = models.DateTimeField(default=expire, blank=True, editable=False, db_index=True)
 
     class Meta:
         unique_together = ['uuid', 'resource']
 
+    @property
+    def ids(self):
+        return to_list(from_bytes(self.data))
+
+    @ids.setter
+    def ids(self, ids):
+        self.data = to_bytes(ids)
+
+
+class FilterCache(models.Model):
+    """ Result cache of the filter endpoint.
+
+    Maps a canonical key of a filter query (prefixed query parameters, concise flag and
+    permission group of the user) to the uuid of the IdCollection holding the results.
+    Identical filter queries reuse the existing IdCollection instead of querying elastic again.
+    The cache is invalidated completely when a study is (re)indexed or deleted.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    uuid = models.UUIDField(null=False, blank=False, editable=False)
+    counts = models.JSONField(default=dict)
+    expire = models.DateTimeField(blank=True, editable=False, db_index=True)
+
+    @classmethod
+    def invalidate(cls):
+        cls.objects.all().delete()
+
+
+
+class StudyStatistics(models.Model):
+    """ Contribution of a study to the database statistics.
+
+    counts: counts of the tables (see managers.STATISTICS_COUNTS)
+    substances: counts of normed interventions and outputs per substance pk
+    """
+    study = models.OneToOneField(Study, related_name="statistics", on_delete=models.CASCADE)
+    counts = models.JSONField(default=dict)
+    substances = models.JSONField(default=dict)
+
+    objects = StudyStatisticsManager()
+
+
+class StatisticsTotal(models.Model):
+    """ Database statistics, i.e. the sum of all StudyStatistics.
+
+    Single row which is updated with every StudyStatistics change. The version is
+    incremented on every update and used to refresh in-memory copies.
+    """
+    PK = 1
+
+    version = models.PositiveIntegerField(default=0)
+    counts = models.JSONField(default=dict)
+    substances = models.JSONField(default=dict)
+
+
+@receiver(pre_delete, sender=Study)
+def remove_study_statistics(sender, instance, **kwargs):
+    StudyStatistics.objects.remove_study(instance)
@@ -3,16 +3,18 @@ Studies serializers.
 """
 from collections import OrderedDict
 
+from django.db import transaction
 from drf_yasg.utils import swagger_auto_schema
 from pkdb_app.data.models import DataSet
 from pkdb_app.data.serializers import DataSetSerializer, DataSetElasticSmallSerializer
 from rest_framework import serializers
 
 from pkdb_app import utils
-from pkdb_app.outputs.models import OutputSet
+from pkdb_app.outputs.models import OutputSet, OutputFact
 from pkdb_app.outputs.serializers import OutputSetSerializer, OutputSetElasticSmallSerializer
-from pkdb_app.users.permissions import get_study_file_permission
-from .models import Reference, Author, Study, Rating
+from pkdb_app.users.permissions import get_study_file_permission, permission_context
+from .documents import update_index_study_permissions
+from .models import Reference, Author, Study, Rating, StudyRight, FilterCache
 from ..comments.models import Description, Comment
 from ..comments.serializers import DescriptionSerializer, CommentSerializer, CommentElasticSerializer, \
     DescriptionElasticSerializer
@@ -401,6 +403,14 @@ class StudySerializer(SidSerializer):
                     study.files.add(file_pk)
 
         study.save()
+        if StudyRight.objects.update_study(study):
+            def update_permissions():
+                # access of the indexed documents and cached filter results of the members
+                update_index_study_permissions(study)
+                FilterCache.invalidate()
+
+            transaction.on_commit(update_permissions)
+        OutputFact.objects.refresh_study(study)
 
         return study
 
@@ -471,11 +481,22 @@ class ReferenceSmallElasticSerializer(serializers.ModelSerializer):
 
 
 class StudyElasticStatisticsSerializer(serializers.Serializer):
+    pk = serializers.IntegerField(read_only=True)
+    sid = serializers.CharField(read_only=True)
     name = serializers.CharField(read_only=True)
     licence = serializers.CharField(read_only=True)
     access = serializers.CharField(read_only=True)
+    date = serializers.DateField(read_only=True)
+
+    group_count = serializers.IntegerField(read_only=True)
+    individual_count = serializers.IntegerField(read_only=True)
+    intervention_count = serializers.IntegerField(read_only=True)
+    output_count = serializers.IntegerField(read_only=True)
+    output_calculated_count = serializers.IntegerField(read_only=True)
+
     curators = CuratorRatingElasticSerializer(many=True, read_only=True)
     creator = UserElasticSerializer(read_only=True)
+    substances = SidNameLabelSerializer(many=True, read_only=True)
 
     class Meta:
         model = Study
@@ -585,7 +606,7 @@ class StudyElasticSerializer(serializers.ModelSerializer):
 
     def get_files(self, obj):
 
-        if get_study_file_permission(self.context["request"].user, obj):
+        if get_study_file_permission(permission_context(self.context["request"]), obj):
             files_serializer = DataFileElasticSerializer(obj.files, many=True, read_only=True)
             return files_serializer.data
 
@@ -0,0 +1,143 @@
+"""
+Summaries of studies (counts, substances and characteristica).
+
+The summaries are computed for a batch of studies with a few grouped aggregate
+queries instead of separate queries per study and property. They are used by the
+study index (StudyDocument), the statistics serializers and the database statistics.
+"""
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import Count, Q
+
+SUMMARY_COUNTS = [
+    "group_count",
+    "individual_count",
+    "intervention_count",
+    "output_count",
+    "output_calculated_count",
+    "subset_count",
+    "timecourse_count",
+    "scatter_count",
+]
+
+
+def study_counts(study_ids) -> dict:
+    """ Counts of the studies with one grouped query per related model.
+
+    :return: dict of study pk -> {count key: count} (see SUMMARY_COUNTS)
+    """
+    from pkdb_app.data.models import SubSet, Data
+    from pkdb_app.interventions.models import Intervention
+    from pkdb_app.outputs.models import Output
+    from pkdb_app.subjects.models import Group, Individual
+
+    study_ids = list(study_ids)
+    counts = {study_id: {key: 0 for key in SUMMARY_COUNTS} for study_id in study_ids}
+
+    def add_counts(queryset, **annotations):
+        for row in queryset.filter(study_id__in=study_ids).values("study_id").annotate(**annotations):
+            counts[row.pop("study_id")].update(row)
+
+    add_counts(Group.objects.all(), group_count=Count("id"))
+    add_counts(Individual.objects.all(), individual_count=Count("id"))
+    add_counts(Intervention.objects.all(), intervention_count=Count("id", filter=Q(normed=True)))
+    add_counts(
+        Output.objects.all(),
+        output_count=Count("id", filter=Q(normed=True)),
+        output_calculated_count=Count("id", filter=Q(normed=True, calculated=True)),
+    )
+    add_counts(
+        SubSet.objects.all(),
+        subset_count=Count("id"),
+        timecourse_count=Count("id", filter=Q(data__data_type=Data.DataTypes.Timecourse)),
+        scatter_count=Count("id", filter=Q(data__data_type=Data.DataTypes.Scatter)),
+    )
+    return counts
+
+
+def study_substances(study_ids) -> dict:
+    """ Basic substances of the studies.
+
+    Substances are collected from interventions and outputs. Derived substances are
+    replaced by their parents.
+
+    :return: dict of study pk -> list of InfoNode
+    """
+    from pkdb_app.info_nodes.models import InfoNode, Substance
+    from pkdb_app.interventions.models import Intervention
+    from pkdb_app.outputs.models import Output
+
+    study_ids = list(study_ids)
+    study_substances = set()
+    for model in [Intervention, Output]:
+        study_substances.update(
+            model.objects.filter(study_id__in=study_ids, substance__isnull=False)
+            .values_list("study_id", "substance_id").distinct()
+        )
+
+    basic_substances = defaultdict(set)
+    rows = Substance.objects.filter(pk__in={substance_id for _, substance_id in study_substances}).values_list(
+        "pk", "info_node_id", "info_node__parents")
+    for substance_id, info_node_id, parent_id in rows:
+        basic_substances[substance_id].add(info_node_id if parent_id is None else parent_id)
+
+    info_node_ids = defaultdict(set)
+    for study_id, substance_id in study_substances:
+        info_node_ids[study_id].update(basic_substances[substance_id])
+
+    info_nodes = InfoNode.objects.in_bulk(set().union(*info_node_ids.values()))
+    return {
+        study_id: [info_nodes[pk] for pk in sorted(info_node_ids[study_id]) if pk in info_nodes]
+        for study_id in study_ids
+    }
+
+
+def study_characteristica(study_ids) -> dict:
+    """ Characteristica of the groups and individuals of the studies.
+
+    :return: dict of study pk -> list of characteristica pks
+    """
+    from pkdb_app.subjects.models import Characteristica
+
+    study_ids = list(study_ids)
+    characteristica = {study_id: [] for study_id in study_ids}
+    rows = Characteristica.objects.filter(
+        Q(group__study_id__in=study_ids) | Q(individual__study_id__in=study_ids)
+    ).values_list("pk", "group__study_id", "individual__study_id")
+    for pk, group_study_id, individual_study_id in rows:
+        study_id = group_study_id if group_study_id in characteristica else individual_study_id
+        characteristica[study_id].append(pk)
+    return characteristica
+
+
+def study_summaries(study_ids) -> dict:
+    """ Summaries of the studies.
+
+    :return: dict of study pk -> {count key: count, "substances": [InfoNode], "characteristica": [pk]}
+    """
+    study_ids = list(study_ids)
+    summaries = study_counts(study_ids)
+    substances = study_substances(study_ids)
+    characteristica = study_characteristica(study_ids)
+    for study_id, summary in summaries.items():
+        summary["substances"] = substances[study_id]
+        summary["characteristica"] = characteristica[study_id]
+    return summaries
+
+
+def with_summaries(studies, batch_size: int = 500):
+    """ Sets the summary on the studies, computed in batches of 'batch_size' studies.
+
+    :param studies: iterable of Study
+    :return: generator of Study
+    """
+    studies = iter(studies)
+    while True:
+        batch = list(islice(studies, batch_size))
+        if not batch:
+            return
+        summaries = study_summaries([study.pk for study in batch])
+        for study in batch:
+            study.summary = summaries[study.pk]
+            yield study
@@ -1,19 +1,25 @@
-import tempfile
+import hashlib
+import json
 import uuid
-import zipfile
 from collections import namedtuple
 from datetime import datetime
-from io import StringIO
-from typing import Dict
+from typing import Dict, List, Tuple
+import threading
 import time
-import pandas as pd
-from django.db import connection
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connection, transaction
 from django.test.client import RequestFactory
 
 import django_filters.rest_framework
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q as DQ, Prefetch
-from django.http import JsonResponse, HttpResponse
+from django.db.models import Q as DQ, Case, When, Value, IntegerField
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django_elasticsearch_dsl_drf.constants import LOOKUP_QUERY_IN, LOOKUP_QUERY_EXCLUDE
@@ -23,8 +29,10 @@ from django_elasticsearch_dsl_drf.viewsets import BaseDocumentViewSet, DocumentV
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from elasticsearch import helpers
+from elasticsearch_dsl.connections import connections as es_connections
 from elasticsearch_dsl.query import Q
 
+from pkdb_app.behaviours import Accessible, StudySnapshot
 from pkdb_app.data.documents import DataAnalysisDocument, SubSetDocument
 from pkdb_app.data.models import SubSet, Data
 from pkdb_app.data.serializers import TimecourseSerializer
@@ -36,6 +44,7 @@ from pkdb_app.interventions.serializers import InterventionElasticSerializerAnal
 from pkdb_app.outputs.serializers import OutputInterventionSerializer
 from pkdb_app.subjects.serializers import GroupCharacteristicaSerializer, IndividualCharacteristicaSerializer
 from rest_framework.generics import get_object_or_404
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework import filters, status, serializers
 from rest_framework import viewsets
@@ -44,16 +53,18 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from pkdb_app.interventions.documents import InterventionDocument
 from pkdb_app.outputs.documents import OutputDocument, \
     OutputInterventionDocument
-from pkdb_app.outputs.models import OutputIntervention
+from pkdb_app.outputs.models import OutputIntervention, OutputFact
 from pkdb_app.pagination import CustomPagination
-from pkdb_app.studies.documents import ReferenceDocument, StudyDocument
+from pkdb_app.studies.documents import ReferenceDocument, StudyDocument, update_index_study_permissions
 from pkdb_app.subjects.documents import GroupDocument, IndividualDocument, \
     GroupCharacteristicaDocument, IndividualCharacteristicaDocument
 from pkdb_app.subjects.models import GroupCharacteristica, IndividualCharacteristica, Group, Individual
 from pkdb_app.users.models import PUBLIC
-from pkdb_app.users.permissions import IsAdminOrCreatorOrCurator, StudyPermission, user_group
+from pkdb_app.users.permissions import IsAdminOrCreatorOrCurator, StudyPermission, permission_context
 from rest_framework.views import APIView
 
+from pkdb_app.id_sets import id_set, to_list, intersection, union
+from .download import zip_stream
 from .serializers import (
     ReferenceSerializer,
     StudySerializer,
@@ -61,13 +72,11 @@ from .serializers import (
     StudyElasticSerializer, StudyAnalysisSerializer,
 )
 
-from django.db.models import Subquery
-from django.db.models import Q
 from pkdb_app.interventions.views import ElasticInterventionViewSet, ElasticInterventionAnalysisViewSet
 from pkdb_app.outputs.models import Output
 from pkdb_app.interventions.models import Intervention
 from pkdb_app.outputs.views import ElasticOutputViewSet, OutputInterventionViewSet
-from pkdb_app.studies.models import Study, IdCollection, Reference
+from pkdb_app.studies.models import Study, IdCollection, Reference, FilterCache, StudyStatistics, StudyRight, expire
 from pkdb_app.subjects.views import GroupViewSet, IndividualViewSet, GroupCharacteristicaViewSet, \
     IndividualCharacteristicaViewSet
 
@@ -110,24 +119,12 @@ class StudyViewSet(viewsets.ModelViewSet):
     permission_classes = (StudyPermission,)
 
     @staticmethod
-    def filter_on_permissions(user, queryset):
-
-        group = user_group(user)
-        if group in ["admin", "reviewer"]:
-            return queryset
-
-        elif group == "basic":
-            return queryset.filter(DQ(access=PUBLIC) |
-                                   DQ(creator=user) |
-                                   DQ(collaborators=user) |
-                                   DQ(curators=user)).distinct()
-
-        elif group == "anonymous":
-            return queryset.filter(access=PUBLIC)
+    def filter_on_permissions(request, queryset):
+        return permission_context(request).filter_studies(queryset)
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        return self.filter_on_permissions(self.request.user, queryset)
+        return self.filter_on_permissions(self.request, queryset)
 
     def destroy(self, request, *args, **kwargs):
 
@@ -137,7 +134,10 @@ class StudyViewSet(viewsets.ModelViewSet):
 
         related_elastic = related_elastic_dict(instance)
         delete_elastic_study(related_elastic)
-        return super().destroy(request, *args, **kwargs)
+        response = super().destroy(request, *args, **kwargs)
+        # the study is removed from elastic and the database
+        transaction.on_commit(FilterCache.invalidate)
+        return response
 
 
 ###############################################################################################
@@ -146,6 +146,15 @@ class StudyViewSet(viewsets.ModelViewSet):
 
 @csrf_exempt
 def update_index_study(request):
+    """ Updates the elastic documents of a study.
+
+    POST {"sid": <study sid>, "action": <action>} with the actions
+    - 'index' (default): indexes all documents of the study
+    - 'delete': deletes all documents of the study
+    - 'permissions': only the creator, curators, collaborators or access of the study changed.
+      Updates the study rights, indexes the study document and sets the access of the other
+      documents (see update_index_study_permissions).
+    """
     if request.method == 'POST':
 
         data = JSONParser().parse(request)
@@ -155,25 +164,84 @@ def update_index_study(request):
         except ObjectDoesNotExist:
             return JsonResponse({"success": "False", "reason": "Instance not in database"})
 
-        related_elastic = related_elastic_dict(study)
-        for doc, instances in related_elastic.items():
-            # code you want to evaluate
-
-            try:
-                action = data.get('action', 'index')
-                doc().update(thing=instances, action=action)
-            except helpers.BulkIndexError:
-                raise helpers.BulkIndexError
+        action = data.get('action', 'index')
+        if action == "permissions":
+            # only the permissions of the study changed
+            StudyRight.objects.update_study(study)
+            documents = bulk_index_study({StudyDocument: [study]}, refresh="wait_for")
+            documents.update(update_index_study_permissions(study))
+        else:
+            related_elastic = related_elastic_dict(study)
+            documents = bulk_index_study(
+                related_elastic, action=action, snapshot=StudySnapshot(study), refresh="wait_for")
+            StudyStatistics.objects.update_study(study)
 
-        return JsonResponse({"success": "True"})
+        # the changes are visible in elastic, so no filter result of the old documents is cached
+        FilterCache.invalidate()
+        return JsonResponse({"success": "True", "documents": documents})
 
 
 def delete_elastic_study(related_elastic):
-    for doc, instances in related_elastic.items():
+    return bulk_index_study(related_elastic, action="delete", raise_on_error=False, refresh="wait_for")
+
+
+def bulk_index_study(related_elastic, action="index", raise_on_error=True, snapshot: StudySnapshot = None,
+                     refresh=None):
+    """ Sends the elastic documents of a study via parallel bulk requests.
+
+    The actions of all documents are created lazily in a single stream, which is send in
+    chunks of 'ELASTIC_BULK_CHUNK_SIZE' actions by 'ELASTIC_BULK_THREADS' threads.
+
+    :param related_elastic: dictionary of elastic documents and instances (see related_elastic_dict)
+    :param action: bulk action, e.g. 'index' or 'delete'
+    :param raise_on_error: raise helpers.BulkIndexError on failed actions
+    :param snapshot: study and permission data set on every Accessible instance
+    :param refresh: refresh parameter of the bulk requests, e.g. 'wait_for' to return
+        after the changes are visible to searches
+    :return: dictionary of document names with number of actions, number of errors and
+             the time to prepare the actions
+    """
+    documents = {}
+    index_documents = {}
+    request_thread = threading.get_ident()
+
+    def actions():
+        # the actions are consumed by a thread of the bulk pool
         try:
-            doc().update(thing=instances, action="delete")
-        except helpers.BulkIndexError:
-            return False, "BulkIndexError"
+            for doc, instances in related_elastic.items():
+                document = doc()
+                name = doc.__name__
+                index_documents[document._index._name] = name
+                documents[name] = {"count": 0, "errors": 0, "time": 0.0}
+                for instance in instances:
+                    time_start = time.time()
+                    if snapshot is not None and isinstance(instance, Accessible):
+                        instance.study_snapshot = snapshot
+                    document_action = document._prepare_action(instance, action)
+                    # stop the clock before the yield, the consumer sends the bulk requests in between
+                    documents[name]["time"] += time.time() - time_start
+                    yield document_action
+        finally:
+            if threading.get_ident() != request_thread:
+                connection.close()
+
+    bulk_params = {} if refresh is None else {"refresh": refresh}
+    results = helpers.parallel_bulk(
+        es_connections.get_connection(),
+        actions(),
+        chunk_size=settings.ELASTIC_BULK_CHUNK_SIZE,
+        thread_count=settings.ELASTIC_BULK_THREADS,
+        raise_on_error=raise_on_error,
+        **bulk_params,
+    )
+    for ok, item in results:
+        info = next(iter(item.values()))
+        name = index_documents[info["_index"]]
+        documents[name]["count"] += 1
+        if not ok:
+            documents[name]["errors"] += 1
+
+    return documents
 
 
 def related_elastic_dict(study):
@@ -207,7 +275,7 @@ def related_elastic_dict(study):
     ]
 
     docs_dict = {
-        StudyDocument: study,
+        StudyDocument: [study],
         GroupDocument: groups,
         IndividualDocument: individuals,
         GroupCharacteristicaDocument: GroupCharacteristica.objects.select_related('group', 'characteristica').filter(
@@ -223,7 +291,7 @@ def related_elastic_dict(study):
         SubSetDocument: subsets,
     }
     if study.reference:
-        docs_dict[ReferenceDocument] = study.reference
+        docs_dict[ReferenceDocument] = [study.reference]
     return docs_dict
 
 
@@ -305,7 +373,8 @@ class ElasticStudyViewSet(BaseDocumentViewSet, APIView):
     @swagger_auto_schema(responses={200: StudyElasticSerializer(many=True)}, manual_parameters=[UUID_PARAM])
     def get_queryset(self):
         """ Test """
-        group = user_group(self.request.user)
+        context = permission_context(self.request)
+        group = context.group
 
         _uuid = self.request.query_params.get("uuid", [])
         if _uuid:
@@ -322,12 +391,10 @@ class ElasticStudyViewSet(BaseDocumentViewSet, APIView):
             return self.search.query()
 
         elif group == "basic":
+            # studies created, curated or collaborated on by the user
             qs = self.search.query(
                 Q('match', access__raw=PUBLIC) |
-                Q('match', creator__username__raw=self.request.user.username) |
-                Q('match', curators__username__raw=self.request.user.username) |
-                Q('match', collaborators__username__raw=self.request.user.username)
-
+                Q('terms', pk=sorted(context.member_study_ids))
             )
             return qs
 
@@ -400,6 +467,10 @@ class ElasticReferenceViewSet(BaseDocumentViewSet):
     }
 
 
+# columns of the fact rows in PKData.concise_ids
+FACT_COLUMNS = {"study": 0, "group": 1, "individual": 2, "output": 3, "intervention": 4}
+
+
 class PKData(object):
     """ PKData represents a consistent set of pharmacokinetic data. """
 
@@ -418,113 +489,84 @@ class PKData(object):
         time_start = time.time()
 
         self.request = request
+        # computed before the concurrent sub queries, which share it
+        self.permission_context = permission_context(request)
 
         time_init = time.time()
 
-        self.outputs = Output.objects.filter(normed=True).select_related("study__sid").prefetch_related(
-            Prefetch(
-                'interventions',
-                queryset=Intervention.objects.only('id'))).only(
-            'group_id', 'individual_id', "id", "interventions__id", "subset__id", "output_type")
+        # one row per normed output and intervention
+        self.facts = OutputFact.objects.all()
 
         #  --- Elastic ---
-        if studies_query:
-            self.studies_query = studies_query
-            studies_pks = self.study_pks()
-            time_elastic_studies = time.time()
-            self.outputs = self.outputs.filter(study_id__in=studies_pks)
+        self.studies_query = studies_query
+        self.groups_query = groups_query
+        self.individuals_query = individuals_query
+        self.interventions_query = {"normed": "true", **interventions_query} if interventions_query else None
+        self.outputs_query = {"normed": "true", **outputs_query} if outputs_query else None
 
-        else:
-            studies_pks = StudyViewSet.filter_on_permissions(request.user, Study.objects).values_list("id", flat=True)
-            self.outputs = self.outputs.filter(study_id__in=Subquery(studies_pks))
+        pk_queries = {}
+        if studies_query:
+            pk_queries["studies"] = self.study_pks
+        if groups_query or individuals_query:
+            pk_queries["groups"] = self.group_pks
+            pk_queries["individuals"] = self.individual_pks
+        if interventions_query:
+            pk_queries["interventions"] = self.intervention_pks
+        if outputs_query:
+            pk_queries["outputs"] = self.output_pks
 
-        self.studies = Study.objects.filter(id__in=studies_pks)
+        pks = {key: id_set(value) for key, value in self.run_pk_queries(pk_queries).items()}
 
+        # pk sets of the elastic queries as {fact column: pks}, the conditions are combined
+        # with 'and', the columns within a condition with 'or'
+        conditions = []
         if groups_query or individuals_query:
-            self.groups_query = groups_query
-            groups_pks = self.group_pks()
-            time_elastic_groups = time.time()
-
-            self.individuals_query = individuals_query
-            individuals_pks = self.individual_pks()
-            time_elastic_individuals = time.time()
-            if concise:
-                self.outputs = self.outputs.filter(
-                    DQ(group_id__in=groups_pks) | DQ(individual_id__in=individuals_pks))
-            else:
-                self.studies = self.studies.filter(
-                    DQ(groups__id__in=groups_pks) | DQ(individuals__id__in=individuals_pks))
-
+            conditions.append({"group": pks["groups"], "individual": pks["individuals"]})
         if interventions_query:
-            self.interventions_query = {"normed": "true", **interventions_query}
-            interventions_pks = self.intervention_pks()
-            time_elastic_interventions = time.time()
-            if concise:
-                self.outputs = self.outputs.filter(interventions__id__in=interventions_pks)
-            else:
-                self.studies = self.studies.filter(interventions__id__in=interventions_pks)
-
+            conditions.append({"intervention": pks["interventions"]})
         if outputs_query:
-            self.outputs_query = {"normed": "true", **outputs_query}
-            outputs_pks = self.output_pks()
-            time_elastic_outputs = time.time()
-            if concise:
-                self.outputs = self.outputs.filter(id__in=outputs_pks)
-            else:
+            conditions.append({"output": pks["outputs"]})
 
-                self.studies = self.studies.filter(outputs__id__in=outputs_pks)
+        if studies_query:
+            studies_pks = pks["studies"]
+        else:
+            studies_pks = id_set(
+                StudyViewSet.filter_on_permissions(request, Study.objects).values_list("id", flat=True))
 
         time_elastic = time.time()
 
         time_loop_start = time.time()
         if concise:
-            studies = set()
-            groups = set()
-            individuals = set()
-            interventions = set()
-            outputs = set()
-            timecourses = set()
-            scatters = set()
-
-            for output in self.outputs.values("study_id", "group_id", "individual_id", "id", "interventions__id",
-                                              "subset__id", "output_type"):
-                studies.add(output["study_id"])
-                if output["group_id"]:
-                    groups.add(output["group_id"])
-                else:
-                    individuals.add(output["individual_id"])
-                outputs.add(output["id"])
-
-                if output["interventions__id"]:
-                    interventions.add(output["interventions__id"])
-
-                if (output["subset__id"] is not None) & (output["output_type"] == Output.OutputTypes.Timecourse):
-                    timecourses.add(output["subset__id"])
-
-                if (output["subset__id"] is not None) & (output["output_type"] == Output.OutputTypes.Array):
-                    scatters.add(output["subset__id"])
-
-            self.ids = {
-                "studies": list(studies),
-                "groups": list(groups),
-                "individuals": list(individuals),
-                "interventions": list(interventions),
-                "outputs": list(outputs),
-                "timecourses": list(timecourses),
-                "scatters": list(scatters),
-            }
+            # only the smallest pk set is send to postgres, the facts are filtered
+            # by the other pk sets in process (see concise_ids)
+            conditions.sort(key=lambda condition: sum(len(column_pks) for column_pks in condition.values()))
+            self.facts = self.facts.filter(study_id__any=studies_pks)
+            if conditions:
+                condition_q = DQ()
+                for column, column_pks in conditions[0].items():
+                    condition_q |= DQ(**{f"{column}_id__any": column_pks})
+                self.facts = self.facts.filter(condition_q)
+            self.ids = self.concise_ids(self.facts, conditions[1:])
 
         else:
-            study_pks = self.studies.distinct().values_list("pk", flat=True)
-
-            self.interventions = Intervention.objects.filter(study_id__in=study_pks, normed=True)
-            self.groups = Group.objects.filter(study_id__in=study_pks)
-            self.individuals = Individual.objects.filter(study_id__in=study_pks)
-            self.outputs = Output.objects.filter(study_id__in=study_pks, normed=True)
-            self.subset = SubSet.objects.filter(study_id__in=study_pks)
+            # studies of every condition, intersected in process
+            study_sets = [studies_pks]
+            models = {"group": Group, "individual": Individual, "intervention": Intervention, "output": Output}
+            for condition in conditions:
+                study_sets.append(union(*[
+                    id_set(models[column].objects.filter(id__any=column_pks).values_list("study_id", flat=True))
+                    for column, column_pks in condition.items()
+                ]))
+            study_pks = intersection(*study_sets)
+
+            self.interventions = Intervention.objects.filter(study_id__any=study_pks, normed=True)
+            self.groups = Group.objects.filter(study_id__any=study_pks)
+            self.individuals = Individual.objects.filter(study_id__any=study_pks)
+            self.outputs = Output.objects.filter(study_id__any=study_pks, normed=True)
+            self.subset = SubSet.objects.filter(study_id__any=study_pks)
 
             self.ids = {
-                "studies": list(study_pks),
+                "studies": study_pks,
                 "groups": list(self.groups.values_list("pk", flat=True)),
                 "individuals": list(self.individuals.values_list("pk", flat=True)),
                 "interventions": list(self.interventions.values_list("pk", flat=True)),
@@ -535,6 +577,8 @@ class PKData(object):
                     self.subset.filter(data__data_type=Data.DataTypes.Scatter).values_list("pk", flat=True)),
             }
 
+        self.ids = {key: to_list(id_set(ids)) for key, ids in self.ids.items()}
+
         time_loop_end = time.time()
 
         time_django = time.time()
@@ -544,14 +588,95 @@ class PKData(object):
 
         print("init:", time_init - time_start)
         print("elastic:", time_elastic - time_init)
+        for key, value in self.timings.items():
+            print(f"elastic {key}:", value)
         print("django:", time_django - time_elastic)
         print("Loop:", time_loop_end - time_loop_start)
 
         print("-" * 80)
 
-    def empty_get(self):
-        """create an get request with no parameters in the url."""
-        return RequestFactory().get("/").GET.copy()
+    @staticmethod
+    def concise_ids(facts, conditions=()) -> Dict:
+        """ Ids of all tables for the given output facts.
+
+        The fact columns are fetched as a single integer array (nulls as -1, output types as codes)
+        and the ids of every table are selected via boolean masks and 'np.unique'.
+
+        :param facts: queryset of OutputFact
+        :param conditions: pk sets as {fact column: pks} the facts are filtered by in process.
+            The conditions are combined with 'and', the columns within a condition with 'or'.
+        :return: dictionary of table names and sorted arrays of ids
+        """
+        output_type_code = Case(
+            When(output_type=Output.OutputTypes.Timecourse, then=Value(1)),
+            When(output_type=Output.OutputTypes.Array, then=Value(2)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        rows = facts.values_list(
+            "study_id",
+            Coalesce("group_id", -1),
+            Coalesce("individual_id", -1),
+            "output_id",
+            Coalesce("intervention_id", -1),
+            Coalesce("subset_id", -1),
+            output_type_code,
+        )
+        return PKData.concise_ids_from_rows(list(rows), conditions)
+
+    @staticmethod
+    def concise_ids_from_rows(rows: List[Tuple], conditions=()) -> Dict:
+        """ Ids of all tables for the given fact rows (see concise_ids).
+
+        :param rows: list of (study, group, individual, output, intervention, subset, output type code)
+        """
+        n_columns = 7
+        data = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows) * n_columns)
+        data = data.reshape(-1, n_columns)
+        for condition in conditions:
+            selected = np.zeros(len(data), dtype=bool)
+            for column, column_pks in condition.items():
+                selected |= np.isin(data[:, FACT_COLUMNS[column]], column_pks)
+            data = data[selected]
+        study, group, individual, output, intervention, subset, output_type = data.T
+
+        has_group = group > 0
+        has_subset = subset >= 0
+        return {
+            "studies": np.unique(study),
+            "groups": np.unique(group[has_group]),
+            "individuals": np.unique(individual[~has_group & (individual >= 0)]),
+            "interventions": np.unique(intervention[intervention > 0]),
+            "outputs": np.unique(output),
+            "timecourses": np.unique(subset[has_subset & (output_type == 1)]),
+            "scatters": np.unique(subset[has_subset & (output_type == 2)]),
+        }
+
+    def run_pk_queries(self, pk_queries: Dict) -> Dict:
+        """ Runs the elastic pk queries concurrently.
+
+        The queries are independent of each other and run in a thread pool limited by
+        'ELASTIC_QUERY_WORKERS'. The duration of every query is stored in 'self.timings'.
+
+        :param pk_queries: dictionary of names and pk query functions
+        :return: dictionary of names and lists of pks
+        """
+        self.timings = {}
+        if not pk_queries:
+            return {}
+
+        def timed(key, func):
+            time_query_start = time.time()
+            try:
+                return func()
+            finally:
+                self.timings[key] = time.time() - time_query_start
+                connection.close()
+
+        max_workers = min(settings.ELASTIC_QUERY_WORKERS, len(pk_queries))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {key: executor.submit(timed, key, func) for key, func in pk_queries.items()}
+            return {key: future.result() for key, future in futures.items()}
 
     def intervention_pks(self):
         return self._pks(view_class=ElasticInterventionViewSet, query_dict=self.interventions_query)
@@ -571,23 +696,26 @@ class PKData(object):
     def study_pks(self):
         return self._pks(view_class=ElasticStudyViewSet, query_dict=self.studies_query, pk_field="pk")
 
-    def set_request_get(self, query_dict: Dict):
-        """
+    def sub_request(self, query_dict: Dict) -> Request:
+        """ Creates a request with the query parameters of a sub query.
+
+        The request of the filter endpoint is not modified, so that sub queries can
+        be evaluated concurrently.
 
-        :param query_dict:
-        :return:
+        :param query_dict: query parameters of the sub query
+        :return: request with the user of the filter request
         """
-        get = self.empty_get()
-        for k, v in query_dict.items():
-            get[k] = v
-        self.request._request.GET = get
+        sub_request = Request(RequestFactory().get("/", data=query_dict or {}))
+        sub_request.user = self.request.user
+        # share the permission context of the filter request
+        sub_request._request._permission_context = self.permission_context
+        return sub_request
 
     def _pks(self, view_class: DocumentViewSet, query_dict: Dict, pk_field: str = "pk", scan_size=10000):
         """
         query elastic search for pks.
         """
-        self.set_request_get(query_dict)
-        view = view_class(request=self.request)
+        view = view_class(request=self.sub_request(query_dict))
         queryset = view.filter_queryset(view.get_queryset())
 
         response = queryset.source([pk_field]).params(size=scan_size).scan()
@@ -605,6 +733,24 @@ class PKData(object):
         else:
             return serializer(queryset.params(size=5000).scan(), many=True).data
 
+    def iter_by_query_dict(self, query_dict, viewset, serializer, boost):
+        """ Generator of the serialized hits of the query.
+
+        In contrast to 'data_by_query_dict' the scan is consumed lazily, so
+        that the hits are never held in memory at once.
+        """
+        view = viewset(request=self.request)
+        queryset = view.get_queryset()
+        if query_dict is not None:
+            queryset = queryset.filter("terms", **query_dict)
+        if boost:
+            queryset = queryset.source(serializer.Meta.fields)
+            for hit in queryset.params(size=5000).scan():
+                yield hit.to_dict()
+        else:
+            for hit in queryset.params(size=5000).scan():
+                yield serializer(hit).data
+
 
 class ResponseSerializer(serializers.Serializer):
     """Documentation of response schema."""
@@ -669,6 +815,23 @@ class PKDataView(APIView):
                 param[key_request[string_len:]] = value
         return param
 
+    def _cache_key(self, request, concise):
+        """ Canonical key of the filter query.
+
+        The key is build from the sorted prefixed query parameters, the concise flag and the
+        permission group of the user. For basic users the username is part of the key,
+        because the results contain their private studies.
+        """
+        group = permission_context(request).group
+        query = {key: sorted(self._get_param(key, request).items()) for key in sorted(self.EXTRA)}
+        canonical = {
+            "query": query,
+            "concise": concise,
+            "group": group,
+            "user": request.user.username if group == "basic" else None,
+        }
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
     # additional parameters
     download__param = openapi.Parameter(
         'download',
@@ -714,9 +877,22 @@ class PKDataView(APIView):
         time_start_request = time.time()
 
         request.GET = request.GET.copy()
+        concise = "false" != request.GET.get("concise", True)
+        download = request.GET.get("download") == "true"
+
+        cache_key = self._cache_key(request, concise)
+        if not download:
+            cached = FilterCache.objects.filter(key=cache_key, expire__gt=datetime.now()).first()
+            if cached:
+                resources = {"uuid": cached.uuid, **cached.counts}
+                print("-" * 80)
+                print("cached:", time.time() - time_start_request)
+                print("-" * 80)
+                return Response(resources, status=status.HTTP_200_OK)
+
         pkdata = PKData(
             request=request,
-            concise="false" != request.GET.get("concise", True),
+            concise=concise,
             studies_query=self._get_param("study", request),
             groups_query=self._get_param("group", request),
             individuals_query=self._get_param("individual", request),
@@ -728,23 +904,29 @@ class PKDataView(APIView):
 
         # calculation of uuid
         queries = []
-        delete_queries = IdCollection.objects.filter(expire__lte=datetime.now())
-        delete_queries.delete()
         _uuid = uuid.uuid4()
+        _expire = expire()
         resources = {"uuid": _uuid}
         for resource, ids in pkdata.ids.items():
-            query = IdCollection(resource=resource, ids=ids, uuid=_uuid)
+            query = IdCollection(resource=resource, ids=ids, uuid=_uuid, expire=_expire)
             queries.append(query)
             resources[resource] = len(ids)
         IdCollection.objects.bulk_create(queries)
 
+        counts = {k: v for k, v in resources.items() if k != "uuid"}
+        FilterCache.objects.update_or_create(
+            key=cache_key,
+            defaults={"uuid": _uuid, "counts": counts, "expire": _expire}
+        )
+
         time_uuid = time.time()
 
-        if request.GET.get("download") == "true":
+        if download:
 
-            def serialize_scatters(ids):
-                scatter_subsets = SubSet.objects.filter(id__in=ids)
-                return [t.scatter_representation for t in scatter_subsets]
+            def serialize_scatters(ids, chunk_size=200):
+                for i in range(0, len(ids), chunk_size):
+                    scatter_subsets = SubSet.objects.filter(id__in=ids[i:i + chunk_size])
+                    yield from SubSet.scatter_representations(scatter_subsets)
 
             Sheet = namedtuple("Sheet",
                                ["sheet_name", "query_dict", "viewset", "serializer", "function", "boost_performance", ])
@@ -771,43 +953,29 @@ class PKDataView(APIView):
                                     False),
             }
 
-            # Create archive
-            with tempfile.SpooledTemporaryFile() as tmp:
-                with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as archive:
-                    download_times = {}
-
-                    for key, sheet in table_content.items():
-                        download_time_start = time.time()
-
-                        string_buffer = StringIO()
-                        if sheet.function:
-                            df = pd.DataFrame(sheet.function(sheet.query_dict["subset_pk"]))
-                            df.to_csv(string_buffer)
-                            archive.writestr(f'{key}.csv', string_buffer.getvalue())
-                            download_times[key] = time.time() - download_time_start
-
-                        else:
-                            df = pd.DataFrame(
-                                pkdata.data_by_query_dict(sheet.query_dict, sheet.viewset, sheet.serializer,
-                                                          sheet.boost_performance))
-                            if len(df) < 0:
-                                df = df[sheet.serializer.Meta.fields]
-                            df.to_csv(string_buffer)
-                            archive.writestr(f'{key}.csv', string_buffer.getvalue())
-                            download_times[key] = time.time() - download_time_start
-
-                    archive.write('download_extra/README.md', 'README.md')
-                    archive.write('download_extra/TERMS_OF_USE.md', 'TERMS_OF_USE.md')
-
-                tmp.seek(0)
-                resp = HttpResponse(tmp.read(), content_type='application/x-zip-compressed')
-                resp['Content-Disposition'] = "attachment; filename=%s" % "pkdata.zip"
-                print("-" * 80)
-                print("File Creation")
-                for k, v in download_times.items():
-                    print(k, v)
-
-                return resp
+            sheets = {}
+            for key, sheet in table_content.items():
+                if sheet.function:
+                    sheets[key] = (SubSet.scatter_fields(), sheet.function(sheet.query_dict["subset_pk"]))
+                else:
+                    if sheet.boost_performance:
+                        fieldnames = sheet.serializer.Meta.fields
+                    else:
+                        fieldnames = list(sheet.serializer().fields)
+                    sheets[key] = (fieldnames, pkdata.iter_by_query_dict(sheet.query_dict, sheet.viewset,
+                                                                         sheet.serializer, sheet.boost_performance))
+
+            # stream archive
+            archive = zip_stream(
+                sheets,
+                extra_files={
+                    'README.md': 'download_extra/README.md',
+                    'TERMS_OF_USE.md': 'download_extra/TERMS_OF_USE.md',
+                },
+            )
+            resp = StreamingHttpResponse(archive, content_type='application/x-zip-compressed')
+            resp['Content-Disposition'] = "attachment; filename=%s" % "pkdata.zip"
+            return resp
 
         response = Response(resources, status=status.HTTP_200_OK)
         time_response = time.time()
@@ -58,6 +58,8 @@ class IndividualDocument(Document):
     )
     characteristica_all_normed = characteristica_object_field
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study__sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
         properties={
@@ -100,6 +102,8 @@ class GroupDocument(Document):
     })
     characteristica_all_normed = characteristica_object_field
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study__sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
         properties={
@@ -183,6 +187,8 @@ class GroupCharacteristicaDocument(Document):
     cv = fields.FloatField(attr='cv')
 
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study_sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
         properties={
@@ -262,6 +268,8 @@ class IndividualCharacteristicaDocument(Document):
     cv = fields.FloatField(attr='cv')
 
     access = string_field('access')
+    # field of the study sid (see AccessView and update_index_study_permissions)
+    study_sid_field = "study_sid__raw"
     allowed_users = fields.ObjectField(
         attr="allowed_users",
         properties={
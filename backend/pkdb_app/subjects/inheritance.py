@@ -0,0 +1,94 @@
+"""
+Inheritance of characteristica in the group hierarchy.
+
+A group inherits the characteristica of its ancestors, an individual the
+characteristica of its group. Inherited characteristica are overwritten by
+characteristica with the same measurement type closer to the group (individual),
+with exception of the ADDITIVE_CHARACTERISTICA which are always inherited.
+
+The inherited normed characteristica (characteristica_all_normed) are resolved for
+all groups and individuals of a study at once via the closure table of the group
+hierarchy (GroupAncestor).
+"""
+from collections import defaultdict, namedtuple
+
+from .models import ADDITIVE_CHARACTERISTICA, Characteristica, GroupAncestor, GroupCharacteristica, Individual, \
+    IndividualCharacteristica
+
+_Characteristica = namedtuple("_Characteristica", ["pk", "measurement_type", "normed", "additive"])
+
+
+def _characteristica_by_subject(subject: str, study_id) -> dict:
+    """ Characteristica of the groups (individuals) of the study by group (individual) pk."""
+    characteristica = defaultdict(list)
+    rows = Characteristica.objects.filter(**{f"{subject}__study_id": study_id}).values_list(
+        f"{subject}_id", "pk", "measurement_type_id", "normed", "measurement_type__info_node__name")
+    for subject_id, pk, measurement_type, normed, measurement_type_name in rows:
+        characteristica[subject_id].append(
+            _Characteristica(pk, measurement_type, normed, measurement_type_name in ADDITIVE_CHARACTERISTICA)
+        )
+    return characteristica
+
+
+def groups_characteristica_all_normed(study_id) -> dict:
+    """ Normed characteristica of the groups of the study including the inherited characteristica.
+
+    :return: dict of group pk -> list of _Characteristica
+    """
+    characteristica = _characteristica_by_subject("group", study_id)
+    ancestors = defaultdict(list)
+    rows = GroupAncestor.objects.filter(group__study_id=study_id).order_by("group_id", "depth").values_list(
+        "group_id", "ancestor_id")
+    for group_id, ancestor_id in rows:
+        ancestors[group_id].append(ancestor_id)
+
+    characteristica_all_normed = {}
+    for group_id, group_ancestors in ancestors.items():
+        overwritten = set()
+        group_characteristica = []
+        # from the group (depth 0) up to the root of the hierarchy
+        for ancestor_id in group_ancestors:
+            ancestor_characteristica = characteristica[ancestor_id]
+            group_characteristica.extend(c for c in ancestor_characteristica
+                                         if c.normed and c.measurement_type not in overwritten)
+            overwritten.update(c.measurement_type for c in ancestor_characteristica if not c.additive)
+        characteristica_all_normed[group_id] = group_characteristica
+    return characteristica_all_normed
+
+
+def individuals_characteristica_all_normed(study_id, groups: dict = None) -> dict:
+    """ Normed characteristica of the individuals of the study including the inherited characteristica.
+
+    :param groups: result of groups_characteristica_all_normed for the study (optional)
+    :return: dict of individual pk -> list of _Characteristica
+    """
+    if groups is None:
+        groups = groups_characteristica_all_normed(study_id)
+    characteristica = _characteristica_by_subject("individual", study_id)
+
+    characteristica_all_normed = {}
+    for individual_id, group_id in Individual.objects.filter(study_id=study_id).values_list("pk", "group_id"):
+        individual_characteristica = [c for c in characteristica[individual_id] if c.normed]
+        overwritten = {c.measurement_type for c in individual_characteristica if not c.additive}
+        individual_characteristica.extend(c for c in groups.get(group_id, [])
+                                          if c.measurement_type not in overwritten)
+        characteristica_all_normed[individual_id] = individual_characteristica
+    return characteristica_all_normed
+
+
+def set_groups_characteristica_all_normed(study_id):
+    """ Adds the normed characteristica including the inherited characteristica to the groups of the study."""
+    GroupCharacteristica.objects.bulk_create([
+        GroupCharacteristica(group_id=group_id, characteristica_id=c.pk)
+        for group_id, characteristica in groups_characteristica_all_normed(study_id).items()
+        for c in characteristica
+    ], ignore_conflicts=True)
+
+
+def set_individuals_characteristica_all_normed(study_id):
+    """ Adds the normed characteristica including the inherited characteristica to the individuals of the study."""
+    IndividualCharacteristica.objects.bulk_create([
+        IndividualCharacteristica(individual_id=individual_id, characteristica_id=c.pk)
+        for individual_id, characteristica in individuals_characteristica_all_normed(study_id).items()
+        for c in characteristica
+    ], ignore_conflicts=True)
@@ -2,7 +2,7 @@
 the managers can be used to overwrite class methods of the models module.
 """
 from django.apps import apps
-from django.db import models
+from django.db import models, transaction
 
 from pkdb_app.utils import create_multiple, create_multiple_bulk, create_multiple_bulk_normalized
 
@@ -17,6 +17,9 @@ class GroupManager(models.Manager):
             kwargs["parent"] = self.model.objects.filter(pk__in=study_groups).get(name=kwargs.get("parent"))
 
         group = super().create(*args, **kwargs)
+        GroupAncestor = apps.get_model('subjects', 'GroupAncestor')
+        GroupAncestor.objects.add_group(group)
+
         characteristica_updated = []
         Characteristica = apps.get_model('subjects', 'Characteristica')
 
@@ -31,6 +34,33 @@ class GroupManager(models.Manager):
         return group
 
 
+class GroupAncestorManager(models.Manager):
+    def add_group(self, group):
+        """ Creates the rows of a new group from the rows of its parent."""
+        ancestors = [self.model(group=group, ancestor=group, depth=0)]
+        if group.parent_id is not None:
+            for ancestor_id, depth in self.filter(group_id=group.parent_id).values_list("ancestor_id", "depth"):
+                ancestors.append(self.model(group=group, ancestor_id=ancestor_id, depth=depth + 1))
+        self.bulk_create(ancestors)
+
+    @transaction.atomic
+    def rebuild(self, batch_size=1000):
+        """ Rebuilds the rows of all groups from the parent fields."""
+        Group = apps.get_model('subjects', 'Group')
+        parents = dict(Group.objects.values_list("pk", "parent_id"))
+
+        ancestors = []
+        for group_id in parents:
+            ancestor_id, depth = group_id, 0
+            while ancestor_id is not None:
+                ancestors.append(self.model(group_id=group_id, ancestor_id=ancestor_id, depth=depth))
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+        self.all().delete()
+        self.bulk_create(ancestors, batch_size=batch_size)
+        return len(parents)
+
+
 class CharacteristicaExManager(models.Manager):
     def create(self, *args, **kwargs):
         comments = kwargs.pop("comments", [])
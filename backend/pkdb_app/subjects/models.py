@@ -12,6 +12,7 @@ from pkdb_app.behaviours import Normalizable
 from .managers import (
     IndividualManager,
     GroupManager,
+    GroupAncestorManager,
     CharacteristicaExManager,
 )
 from ..behaviours import (
@@ -127,24 +128,24 @@ class Group(Accessible):
 
     @property
     def parents(self):
-        parents = []
-        if self.parent:
-            parents = [self.parent.pk] + self.parent.parents
-        return parents
+        return list(self.ancestor_links.filter(depth__gt=0).order_by("depth").values_list("ancestor_id", flat=True))
 
-    @property
-    def _characteristica_all(self):
-        _characteristica_all = self.characteristica.all()
-        this_measurements = _characteristica_all.exclude(
-            measurement_type__info_node__name__in=ADDITIVE_CHARACTERISTICA).values_list("measurement_type", flat=True)
-        if self.parent:
-            _characteristica_all = _characteristica_all | self.parent._characteristica_all.exclude(
-                measurement_type__in=this_measurements)
-        return _characteristica_all
 
-    @property
-    def _characteristica_all_normed(self):
-        return self._characteristica_all.filter(normed=True)
+class GroupAncestor(models.Model):
+    """ Closure table of the group hierarchy.
+
+    Every group has a row for itself (depth 0) and for each of its ancestors
+    (parent with depth 1, grandparent with depth 2, ...). The rows are created
+    with the group (see GroupManager.create).
+    """
+    group = models.ForeignKey(Group, related_name="ancestor_links", on_delete=models.CASCADE)
+    ancestor = models.ForeignKey(Group, related_name="descendant_links", on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    objects = GroupAncestorManager()
+
+    class Meta:
+        unique_together = ("group", "ancestor")
 
 
 # ----------------------------------
@@ -222,21 +223,6 @@ class Individual(AbstractIndividual, Accessible):
     def image(self):
         return self.ex.image
 
-    @property
-    def _characteristica_normed(self):
-        return self.characteristica.filter(normed=True)
-
-    @property
-    def _characteristica_all_normed(self):
-        _characteristica_normed = self._characteristica_normed
-
-        # charcteristica from related groups with the same measurement type as these used in the individual are excluded.
-        # this_measurements = characteristica_normed.values_list("measurement_type", flat=True)
-        this_measurements = _characteristica_normed.exclude(
-            measurement_type__info_node__name__in=ADDITIVE_CHARACTERISTICA).values_list("measurement_type", flat=True)
-        return (_characteristica_normed | self.group._characteristica_all_normed.exclude(
-            measurement_type__in=this_measurements))
-
     @property
     def group_indexing(self):
         return self.group.name
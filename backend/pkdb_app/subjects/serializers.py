@@ -16,6 +16,7 @@ from .models import (
     Individual,
     CharacteristicaEx,
     GroupEx )
+from .inheritance import set_groups_characteristica_all_normed, set_individuals_characteristica_all_normed
 from ..comments.serializers import DescriptionSerializer, CommentSerializer, DescriptionElasticSerializer, \
     CommentElasticSerializer
 from ..serializers import WrongKeyValidationSerializer, ExSerializer, ReadSerializer
@@ -326,9 +327,8 @@ class GroupSetSerializer(ExSerializer):
             study_group_exs.append(study_group_ex)
         groupset.save()
 
-        # add characteristica from parents to the all_characteristica_normed if each group
-        for group in groupset.groups:
-            group.characteristica_all_normed.add(*group._characteristica_all_normed)
+        # add characteristica from parents to the all_characteristica_normed of each group
+        set_groups_characteristica_all_normed(self.context["study"].pk)
         return groupset
 
     @staticmethod
@@ -553,10 +553,6 @@ class IndividualExSerializer(ExSerializer):
             individual["study"] = self.context["study"]
         individuals = create_multiple(individual_ex, individuals, "individuals")
 
-        # add characteristica from parents to the all_characteristica_normed if each individual
-        for individual in individuals:
-            individual.characteristica_all_normed.add(*individual._characteristica_all_normed)
-
         individual_ex.save()
         return individual_ex
 
@@ -591,6 +587,9 @@ class IndividualSetSerializer(ExSerializer):
 
         IndividualExSerializer(context=self.context, many=True).create(validated_data=poped_data["individual_exs"])
 
+        # add characteristica from groups to the all_characteristica_normed of each individual
+        set_individuals_characteristica_all_normed(self.context["study"].pk)
+
         return individualset
 
 
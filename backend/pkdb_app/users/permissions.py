@@ -1,8 +1,6 @@
-from django_elasticsearch_dsl_drf.utils import DictionaryProxy
-from elasticsearch_dsl import AttrDict
 from rest_framework import permissions
 
-from pkdb_app.studies.models import OPEN, Study
+from pkdb_app.studies.models import OPEN, StudyRight
 from pkdb_app.users.models import PUBLIC
 
 
@@ -65,12 +63,10 @@ class StudyPermission(permissions.BasePermission):
 
 
 def study_permissions(request, obj):
-    study_permissions = {"admin": admin_permission(),
-                         "basic": basic_permission(request, obj),
-                         "reviewer": reviewer_permission(request, obj),
-                         "anonymous": anonymous_permissions(request, obj)}
-
-    return study_permissions[user_group(request.user)]
+    context = permission_context(request)
+    if is_allowed_method(request):
+        return context.can_read(obj)
+    return context.can_write(obj)
 
 
 def user_group(user):
@@ -87,70 +83,76 @@ def user_group(user):
     return user_group
 
 
-def get_study_permission(user, obj):
-    try:
-        allowed_user_modify = (user == obj.creator) or (user in obj.curators)
-        allow_user_get = (user in obj.collaborators) or (obj.access == PUBLIC) or allowed_user_modify
-    except TypeError:
-        allowed_user_modify = (user == obj.creator) or (user in obj.curators.all())
-        allow_user_get = (user in obj.collaborators.all()) or (obj.access == PUBLIC) or allowed_user_modify
-
-    permission_dict = {
-        "admin": True,
-        "anonymous": (obj.access == PUBLIC),
-        "reviewer": True,
-        "basic": allow_user_get
-    }
-    return permission_dict[user_group(user)]
-
-
-def get_study_file_permission(user, obj):
-    allow_user_get = False
-    if isinstance(obj, AttrDict) or isinstance(obj, DictionaryProxy):
-        username = user.username
-        curator_usernames = [curator["username"] for curator in obj.curators]
-        collaborators_usernames = [collaborator["username"] for collaborator in obj.collaborators]
-        allowed_user_modify = (username == obj.creator["username"]) or (user in curator_usernames)
-        allow_user_get = (user in collaborators_usernames) or (obj.licence == OPEN) or allowed_user_modify
-
-    elif isinstance(obj, Study):
-        allowed_user_modify = (user == obj.creator) or (user in obj.curators.all())
-        allow_user_get = (user in obj.collaborators.all()) or (obj.licence == OPEN) or allowed_user_modify
-
-    permission_dict = {
-        "admin": True,
-        "anonymous": obj.licence == OPEN,
-        "reviewer": True,
-        "basic": allow_user_get
-    }
-    return permission_dict[user_group(user)]
-
-
-def anonymous_permissions(request, obj):
-    if is_allowed_method(request):
-        return get_study_permission(request.user, obj)
-    return False
+class PermissionContext(object):
+    """ Permissions of a user on studies.
 
+    The permission group of the user and the studies the user created, curates or
+    collaborates on (see StudyRight) are looked up once and reused by all permission
+    checks of a request (see permission_context). Studies are either Study instances
+    or elastic documents of studies.
+    """
 
-def basic_permission(request, obj):
-    user = request.user
-    try:
-        allowed_user_modify = (user == obj.creator) or (user in obj.curators)
-    except TypeError:
-        allowed_user_modify = (user == obj.creator) or (user in obj.curators.all())
+    def __init__(self, user):
+        self.user = user
+        self.username = user.username
+        self.group = user_group(user)
+        self.writable_study_ids = frozenset()
+        self.member_study_ids = frozenset()
+        self.member_study_sids = frozenset()
+
+        if self.group == "basic":
+            rights = list(StudyRight.objects.filter(user=user).values_list("study_id", "study__sid", "right"))
+            self.writable_study_ids = frozenset(pk for pk, _, right in rights if right == StudyRight.Rights.Write)
+            self.member_study_ids = frozenset(pk for pk, _, right in rights if right == StudyRight.Rights.Read)
+            self.member_study_sids = frozenset(sid for _, sid, right in rights if right == StudyRight.Rights.Read)
+
+    def is_member(self, study) -> bool:
+        """ User is creator, curator or collaborator of the study."""
+        return int(study.pk) in self.member_study_ids
+
+    def can_read(self, study) -> bool:
+        if self.group in ["admin", "reviewer"]:
+            return True
+        if self.group == "basic" and self.is_member(study):
+            return True
+        return study.access == PUBLIC
 
-    if is_allowed_method(request):
-        return get_study_permission(user, obj)
+    def can_write(self, study) -> bool:
+        if self.group == "admin":
+            return True
+        return self.group == "basic" and int(study.pk) in self.writable_study_ids
 
-    return allowed_user_modify
+    def can_read_files(self, study) -> bool:
+        if self.group in ["admin", "reviewer"]:
+            return True
+        if self.group == "basic" and self.is_member(study):
+            return True
+        return study.licence == OPEN
 
+    def filter_studies(self, queryset):
+        """ Studies of the queryset which can be read by the user."""
+        if self.group in ["admin", "reviewer"]:
+            return queryset
+        elif self.group == "basic":
+            return queryset.filter(pk__in=StudyRight.objects.readable(self.user))
+        return queryset.filter(access=PUBLIC)
 
-def reviewer_permission(request, obj):
-    if is_allowed_method(request):
-        return get_study_permission(request.user, obj)
-    else:
-        return False
+
+def permission_context(request, user=None) -> PermissionContext:
+    """ Permission context of the user of the request (or the given user), computed once per request.
+
+    The context is stored on the django request, so that it is shared by all
+    rest framework requests wrapping it (e.g. of viewsets called within a view).
+    """
+    if user is None:
+        user = request.user
+    http_request = getattr(request, "_request", request)
+    context = getattr(http_request, "_permission_context", None)
+    if context is None or context.user != user:
+        context = PermissionContext(user)
+        http_request._permission_context = context
+    return context
 
 
-def admin_permission():
-    return True
+def get_study_file_permission(context: PermissionContext, obj):
+    return context.can_read_files(obj)
@@ -3,6 +3,9 @@ Generic utility functions.
 """
 import copy
 import os
+from collections import defaultdict
+
+import numpy as np
 import pandas as pd
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
@@ -124,8 +127,7 @@ def create_multiple_bulk(parent, related_name_parent, children, class_child):
 
 def create_multiple_bulk_normalized(notnormalized_instances, model_class):
     if notnormalized_instances:
-        return model_class.objects.bulk_create(
-            [initialize_normed(notnorm_instance) for notnorm_instance in notnormalized_instances])
+        return model_class.objects.bulk_create(initialize_normed_batch(notnormalized_instances, model_class))
 
 
 def _create(validated_data, model_manager=None, model_serializer=None,
@@ -149,11 +151,10 @@ def _create(validated_data, model_manager=None, model_serializer=None,
     return instance, popped_data
 
 
-def initialize_normed(notnorm_instance):
+def _normed_copy(notnorm_instance):
     norm = copy.copy(notnorm_instance)
     norm.pk = None
     norm.normed = True
-    norm.normalize()
     norm.raw_id = notnorm_instance.pk
 
     try:
@@ -165,13 +166,107 @@ def initialize_normed(notnorm_instance):
         norm.group_id = notnorm_instance.group.pk
     except AttributeError:
         pass
+    return norm
+
+
+def initialize_normed_batch(notnorm_instances, model_class):
+    """ Normalized copies of the instances.
+
+    The values of all instances with the same unit conversion are normalized at once,
+    the error measures are calculated on arrays.
+    """
+    normed = [_normed_copy(notnorm_instance) for notnorm_instance in notnorm_instances]
+    normalize_batch(normed)
 
     # interventions have no add add_error_measures() because they should have no mean,median,sd,se,cv ...
-    try:
-        norm.add_error_measures()
-    except AttributeError:
-        pass
-    return norm
+    if hasattr(model_class, "add_error_measures"):
+        add_error_measures_batch(normed, model_class)
+    return normed
+
+
+NORM_FIELDS = ["value", "mean", "median", "min", "max", "sd", "se"]
+
+
+def _float_array(instances, field):
+    """ Values of the field as float array (None -> nan) and mask of present values."""
+    values = [getattr(instance, field) for instance in instances]
+    present = np.array([value is not None for value in values], dtype=bool)
+    array = np.array([np.nan if value is None else value for value in values], dtype=float)
+    return array, present
+
+
+def _set_floats(instances, field, array, present, mask):
+    """ Sets the values of the instances selected by mask (None if not present)."""
+    for index in np.flatnonzero(mask):
+        setattr(instances[index], field, array[index].item() if present[index] else None)
+
+
+def normalize_batch(instances):
+    """ Normalizes the values of the instances grouped by their unit conversion (see Normalizable.normalize)."""
+    groups = defaultdict(list)
+    for instance in instances:
+        if instance.unit:
+            groups[instance.conversion].append(instance)
+
+    for conversion, group in groups.items():
+        if conversion.substance_factor is None and conversion.factor is None:
+            continue
+        for field in NORM_FIELDS:
+            array, present = _float_array(group, field)
+            if conversion.substance_factor is not None:
+                array = array * conversion.substance_factor
+            if conversion.factor is not None:
+                array = array * conversion.factor + conversion.offset
+            _set_floats(group, field, array, present, present)
+
+        unit = conversion.unit if conversion.factor is not None else conversion.substance_unit
+        for instance in group:
+            instance.unit = unit
+
+
+def add_error_measures_batch(instances, model_class):
+    """ Calculates missing sd, se and cv of instances with group (see Output.add_error_measures)."""
+    instances = [instance for instance in instances if instance.group_id is not None]
+    if not instances:
+        return
+
+    group_class = model_class._meta.get_field("group").related_model
+    group_counts = dict(group_class.objects.filter(
+        pk__in={instance.group_id for instance in instances}).values_list("pk", "count"))
+    count_values = [group_counts.get(instance.group_id) for instance in instances]
+    count_present = np.array([count is not None for count in count_values], dtype=bool)
+    count = np.array([np.nan if c is None else c for c in count_values], dtype=float)
+
+    mean, mean_present = _float_array(instances, "mean")
+    sd, sd_present = _float_array(instances, "sd")
+    se, se_present = _float_array(instances, "se")
+    cv, cv_present = _float_array(instances, "cv")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # sd
+        missing = ~sd_present | (sd == 0)
+        sd = np.where(missing, cv * mean, sd)
+        sd_present = np.where(missing, cv_present & mean_present, sd_present)
+        _set_floats(instances, "sd", sd, sd_present, missing)
+
+        # se
+        missing = ~se_present | (se == 0)
+        from_sd = sd_present & count_present
+        from_cv = ~from_sd & count_present & mean_present & cv_present
+        se = np.where(missing & from_sd, sd / np.sqrt(count), se)
+        se = np.where(missing & from_cv, (cv * mean) / np.sqrt(count), se)
+        se_present = np.where(missing, from_sd | from_cv, se_present)
+        _set_floats(instances, "se", se, se_present, missing)
+
+        # cv, mean can be zero, CV not calculatable
+        missing = ~cv_present | (cv == 0)
+        mean_clean = np.where(mean == 0.0, np.nan, mean)
+        from_sd = sd_present & mean_present
+        from_se = ~from_sd & se_present & count_present & mean_present
+        cv = np.where(missing & from_sd, sd / mean_clean, cv)
+        cv = np.where(missing & from_se, (se * np.sqrt(count)) / mean_clean, cv)
+        cv_present = np.where(missing, from_sd | from_se, cv_present)
+        _set_floats(instances, "cv", cv, cv_present, missing)
 
 
 def recursive_iter(obj, keys=()):
@@ -7,7 +7,7 @@ from copy import copy
 from django.http import FileResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
 from rest_framework.authentication import TokenAuthentication
-from pkdb_app.users.permissions import get_study_file_permission
+from pkdb_app.users.permissions import get_study_file_permission, permission_context
 from .subjects.models import DataFile
 
 from drf_yasg.generators import OpenAPISchemaGenerator
@@ -22,7 +22,7 @@ def serve_protected_document(request, file):
     path, file_name = os.path.split(file)
     datafile = get_object_or_404(DataFile, file=file)
     study = datafile.study_set.all()[0]
-    if get_study_file_permission(user, study):
+    if get_study_file_permission(permission_context(request, user), study):
         # Split the elements of the path
         response = FileResponse(datafile.file, )
         response["Content-Disposition"] = "attachment; filename=" + file_name
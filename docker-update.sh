@@ -19,6 +19,7 @@ docker-compose -f $PKDB_DOCKER_COMPOSE_YAML down
 echo "*** Remove containers ***"
 docker container rm -f pkdb_frontend_1
 docker container rm -f pkdb_backend_1
+docker container rm -f pkdb_purge_1
 docker container rm -f pkdb_postgres_1
 docker container rm -f pkdb_elasticsearch_1
 docker container rm -f pkdb_nginx_1
@@ -26,6 +27,7 @@ docker container rm -f pkdb_nginx_1
 echo "*** Remove images ***"
 docker image rm -f pkdb_frontend:latest
 docker image rm -f pkdb_backend:latest
+docker image rm -f pkdb_purge:latest
 docker image rm -f pkdb_postgres:latest
 docker image rm -f pkdb_elasticsearch:latest
 docker image rm -f pkdb_nginx:latest